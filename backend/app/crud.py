@@ -1,21 +1,35 @@
+from sqlalchemy import (
+    DateTime, Float, Integer, case, cast, column, delete, func, true, tuple_, union, update, values
+)
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.orm import aliased
 from uuid import UUID
-from typing import List, Optional
-from app.models import User, Product, PriceHistory, ProductURL
-from app.schemas.user import UserInDB
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+from app.enums import RollupGranularity
+from app.models import (
+    User, Product, PriceHistory, ProductURL, ScrapeCache, ProductPriceRollup, ProductURLPriceRollup
+)
 from app.schemas.productUrl import ProductUrlInDB, ProductUrlCreate, ProductUrlUpdate
 from app.schemas.product import ProductInDB, ProductCreate, ProductUpdate
 from app.schemas.priceHistory import PriceHistoryInDB, PriceHistoryCreate
+from app.schemas.priceRollup import PriceRollupInDB
+from app.schemas.scrapeCache import ScrapeCacheInDB, ScrapeCacheUpsert
+from app.utils.config.settings import settings
+from app.utils.urls import canonical_url
 
 #------ PRODUCT URL CRUD ------
 async def create_product_url(db: AsyncSession, data: ProductUrlCreate) -> ProductUrlInDB:
+    # the same page under another URL variant counts as already tracked
     result = await db.execute(
         select(ProductURL)
         .where(ProductURL.product_id == data.product_id)
-        .where(ProductURL.url == data.url.strip())
+        .where(ProductURL.canonical_key == canonical_url(data.url))
     )
-    existing = result.scalar_one_or_none()
+    existing = result.scalars().first()
     
     if existing:
         return ProductUrlInDB.model_validate(existing)
@@ -49,6 +63,8 @@ async def update_product_url(
     
     for key, value in data.model_dump(exclude_unset=True).items():
         setattr(product_url, key, value)
+    if data.url is not None:
+        product_url.canonical_key = canonical_url(data.url)
         
     await db.commit()
     await db.refresh(product_url)
@@ -104,6 +120,17 @@ async def get_product_by_id(db: AsyncSession, product_id: UUID) -> Optional[Prod
     
     return ProductInDB.model_validate(product)
 
+async def get_product_names(
+    db: AsyncSession, product_ids: List[UUID], chunk: int = 5000
+) -> Dict[UUID, str]:
+    names = {}
+    for start in range(0, len(product_ids), chunk):
+        results = await db.execute(
+            select(Product.id, Product.name).where(Product.id.in_(product_ids[start:start + chunk]))
+        )
+        names.update(results.tuples().all())
+    return names
+
 async def update_product(db: AsyncSession, product_id: UUID, data: ProductUpdate) -> Optional[ProductInDB]:
     result = await db.execute(select(Product).where(Product.id == product_id))
     product = result.scalars().first()
@@ -129,25 +156,201 @@ async def delete_product(db: AsyncSession, product_id: UUID) -> bool:
 
 #------ PRICE HISTORY CRUD ------
 
-async def create_price_history(db: AsyncSession, data: PriceHistoryCreate) -> PriceHistoryInDB:
-    updated_product = await update_product(
-        db=db, product_id=data.product_id, data=ProductUpdate(current_price=data.price)
+async def create_price_history(db: AsyncSession, data: PriceHistoryCreate) -> Optional[PriceHistoryInDB]:
+    """
+    Record one price the same way bulk_create_price_history does: in "on_change" mode an
+    unchanged price extends the URL's current row, which is returned. None for an unknown product.
+    """
+    result = await db.execute(
+        update(Product)
+        .where(Product.id == data.product_id)
+        .values(current_price=data.price, last_checked=data.recorded_at)
+        .returning(Product.id)
     )
-    if not updated_product:
+    if result.scalar_one_or_none() is None:
         return None
     
-    new_price_history = PriceHistory(**data.model_dump())
-    db.add(new_price_history)
+    if settings.PRICE_HISTORY_MODE == "on_change" and await _extend_unchanged_runs(db, [data]):
+        result = await db.execute(
+            select(PriceHistory)
+            .where(PriceHistory.product_url_id == data.product_url_id)
+            .order_by(PriceHistory.recorded_at.desc())
+            .limit(1)
+            .execution_options(populate_existing=True)
+        )
+        price_history = result.scalars().first()
+    else:
+        price_history = PriceHistory(**data.model_dump())
+        db.add(price_history)
+    await upsert_price_rollups(db, [data])
     await db.commit()
-    await db.refresh(new_price_history)
     
-    return PriceHistoryInDB.model_validate(new_price_history)
+    return PriceHistoryInDB.model_validate(price_history)
+
+async def _extend_unchanged_runs(db: AsyncSession, rows: List[PriceHistoryCreate]) -> set:
+    """
+    For every row whose URL's latest history row has the same price, move that row's
+    last_seen_at to the new observation instead of inserting. One UPDATE; each URL's
+    latest row is found through ix_price_history_product_url_recorded.
+    Returns the product_url_ids that were extended.
+    """
+    observed = values(
+        column("product_url_id", PG_UUID(as_uuid=True)),
+        column("price", Float),
+        column("seen_at", DateTime(timezone=True)),
+        name="observed"
+    ).data([(row.product_url_id, row.price, row.recorded_at) for row in rows])
+    
+    latest = aliased(PriceHistory)
+    current = (
+        select(latest.id, latest.price, latest.recorded_at)
+        .where(latest.product_url_id == observed.c.product_url_id)
+        .order_by(latest.recorded_at.desc())
+        .limit(1)
+        .lateral("latest_row")
+    )
+    runs = (
+        select(current.c.id, current.c.recorded_at, observed.c.seen_at)
+        .select_from(observed)
+        .join(current, true())
+        .where(current.c.price == observed.c.price)
+        .where(current.c.recorded_at < observed.c.seen_at)
+        .cte("runs")
+    )
+    
+    result = await db.execute(
+        update(PriceHistory)
+        .where(PriceHistory.id == runs.c.id)
+        .where(PriceHistory.recorded_at == runs.c.recorded_at) # lets partitioning prune
+        .values(last_seen_at=func.greatest(PriceHistory.last_seen_at, runs.c.seen_at))
+        .returning(PriceHistory.product_url_id)
+        .execution_options(synchronize_session=False)
+    )
+    return set(result.scalars().all())
+
+async def bulk_create_price_history(db: AsyncSession, rows: List[PriceHistoryCreate]) -> int:
+    """
+    Record many scraped prices and move each product's current price to its latest
+    one, then commit once. With PRICE_HISTORY_MODE "on_change" an unchanged price only
+    extends the URL's current row (see _extend_unchanged_runs); otherwise, and for new
+    prices, rows are inserted in one statement. Rows that hit `uq_price_once_per_url_time`
+    are skipped. Returns the number inserted.
+    """
+    if not rows:
+        return 0
+    
+    to_insert = rows
+    if settings.PRICE_HISTORY_MODE == "on_change":
+        extended = await _extend_unchanged_runs(db, rows)
+        to_insert = [row for row in rows if row.product_url_id not in extended]
+    
+    inserted = 0
+    if to_insert:
+        result = await db.execute(
+            insert(PriceHistory)
+            .values([row.model_dump() for row in to_insert])
+            .on_conflict_do_nothing(constraint="uq_price_once_per_url_time")
+            .returning(PriceHistory.id)
+        )
+        inserted = len(result.all())
+    
+    # one UPDATE ... FROM (VALUES ...) for every product, each set to its latest price
+    latest = {}
+    for row in sorted(rows, key=lambda r: r.recorded_at):
+        latest[row.product_id] = (row.product_id, row.price, row.recorded_at)
+    checked = values(
+        column("id", PG_UUID(as_uuid=True)),
+        column("price", Float),
+        column("checked_at", DateTime(timezone=True)),
+        name="checked"
+    ).data(list(latest.values()))
+    await db.execute(
+        update(Product)
+        .where(Product.id == checked.c.id)
+        .values(current_price=checked.c.price, last_checked=checked.c.checked_at)
+        .execution_options(synchronize_session=False)
+    )
+    
+    await upsert_price_rollups(db, rows)
+    await db.commit()
+    return inserted
 
 async def get_product_price_history(db: AsyncSession, product_id: UUID) -> List[PriceHistoryInDB]:
     results = await db.execute(select(PriceHistory).where(PriceHistory.product_id == product_id))
     price_histories = results.scalars().all()
     return [PriceHistoryInDB.model_validate(h) for h in price_histories]
 
+async def get_price_history_by_product(
+    db: AsyncSession,
+    product_id: UUID,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = 100,
+    after: Optional[Tuple[datetime, UUID]] = None,
+    descending: bool = False,
+    product_url_id: Optional[UUID] = None
+) -> List[PriceHistoryInDB]:
+    """
+    One page of a product's history ordered by (recorded_at, id): the rows that overlap
+    [start, end), so a run that began before `start` and was still seen after it is
+    included. `after` is the (recorded_at, id) of the previous page's last row; the
+    window filter doesn't depend on it, so pages stay consistent.
+    """
+    stmt = select(PriceHistory).where(PriceHistory.product_id == product_id)
+    if product_url_id is not None:
+        stmt = stmt.where(PriceHistory.product_url_id == product_url_id)
+    if start is not None:
+        stmt = stmt.where(func.coalesce(PriceHistory.last_seen_at, PriceHistory.recorded_at) >= start)
+    if end is not None:
+        stmt = stmt.where(PriceHistory.recorded_at < end)
+    
+    key = tuple_(PriceHistory.recorded_at, PriceHistory.id)
+    if after is not None:
+        if descending:
+            stmt = stmt.where(PriceHistory.recorded_at <= after[0]).where(key < after)
+        else:
+            stmt = stmt.where(PriceHistory.recorded_at >= after[0]).where(key > after)
+    
+    if descending:
+        stmt = stmt.order_by(PriceHistory.recorded_at.desc(), PriceHistory.id.desc())
+    else:
+        stmt = stmt.order_by(PriceHistory.recorded_at, PriceHistory.id)
+    
+    results = await db.execute(stmt.limit(limit))
+    return [PriceHistoryInDB.model_validate(h) for h in results.scalars().all()]
+
+async def get_price_runs(
+    db: AsyncSession,
+    product_id: UUID,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    product_url_id: Optional[UUID] = None
+) -> List[tuple]:
+    """
+    (product_url_id, recorded_at, last_seen_at, price) rows that overlap [start, end),
+    ordered by recorded_at. Plain columns, no ORM objects, for series building.
+    """
+    stmt = (
+        select(
+            PriceHistory.product_url_id,
+            PriceHistory.recorded_at,
+            PriceHistory.last_seen_at,
+            PriceHistory.price
+        )
+        .where(PriceHistory.product_id == product_id)
+        .order_by(PriceHistory.recorded_at)
+    )
+    if product_url_id is not None:
+        stmt = stmt.where(PriceHistory.product_url_id == product_url_id)
+    if end is not None:
+        stmt = stmt.where(PriceHistory.recorded_at < end)
+    if start is not None:
+        # a run that began earlier may still cover the window
+        stmt = stmt.where(func.coalesce(PriceHistory.last_seen_at, PriceHistory.recorded_at) >= start)
+    
+    results = await db.execute(stmt)
+    return results.all()
+
 async def get_price_history_by_id(db: AsyncSession, ph_id: UUID) -> Optional[PriceHistoryInDB]:
     result = await db.execute(select(PriceHistory).where(PriceHistory.id == ph_id))
     price_history = result.scalars().first()
@@ -164,4 +367,434 @@ async def delete_price_history(db: AsyncSession, ph_id: UUID) -> bool:
     
     await db.delete(price_history)
     await db.commit()
-    return True
\ No newline at end of file
+    return True
+
+#------ PRICE ROLLUP CRUD ------
+ROLLUP_MODELS = (
+    (ProductPriceRollup, ProductPriceRollup.product_id, "product_id"),
+    (ProductURLPriceRollup, ProductURLPriceRollup.product_url_id, "product_url_id"),
+)
+
+BUCKET_WIDTHS = {RollupGranularity.HOUR: timedelta(hours=1), RollupGranularity.DAY: timedelta(days=1)}
+
+def _bucket_start(at: datetime, granularity: RollupGranularity) -> datetime:
+    # same boundaries as date_trunc(granularity, at, 'UTC')
+    at = at.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    return at.replace(hour=0) if granularity == RollupGranularity.DAY else at
+
+def _fold_sighting(
+    buckets: Dict[tuple, dict], key: str, owner: UUID, granularity: RollupGranularity,
+    price: float, at: datetime
+):
+    bucket = (owner, granularity.value, _bucket_start(at, granularity))
+    agg = buckets.get(bucket)
+    if agg is None:
+        buckets[bucket] = {
+            key: owner, "granularity": granularity.value, "bucket_start": bucket[2],
+            "min_price": price, "max_price": price,
+            "first_price": price, "first_at": at,
+            "last_price": price, "last_at": at,
+            "sample_count": 1, "price_sum": price,
+        }
+        return
+    agg["min_price"] = min(agg["min_price"], price)
+    agg["max_price"] = max(agg["max_price"], price)
+    if at < agg["first_at"]:
+        agg["first_price"], agg["first_at"] = price, at
+    if at >= agg["last_at"]:
+        agg["last_price"], agg["last_at"] = price, at
+    agg["sample_count"] += 1
+    agg["price_sum"] += price
+
+def _sorted_rollups(buckets: Dict[tuple, dict]) -> List[dict]:
+    # a stable order keeps concurrent writers from deadlocking on the same buckets
+    return [buckets[bucket] for bucket in sorted(buckets, key=lambda b: (str(b[0]), b[1], b[2]))]
+
+def _aggregate_rollups(rows: List[PriceHistoryCreate], key: str) -> List[dict]:
+    buckets: Dict[tuple, dict] = {}
+    for row in rows:
+        owner = getattr(row, key)
+        if owner is None:
+            continue
+        for granularity in RollupGranularity:
+            _fold_sighting(buckets, key, owner, granularity, row.price, row.recorded_at)
+    return _sorted_rollups(buckets)
+
+def _run_sightings(
+    recorded_at: datetime,
+    last_seen_at: Optional[datetime],
+    granularity: RollupGranularity,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+) -> Iterator[datetime]:
+    """
+    When a stored row is known to have been seen: recorded_at, the start of every bucket
+    strictly between it and last_seen_at (the run held its price through them), and
+    last_seen_at. Only sightings in [since, until).
+    """
+    def inside(at: datetime) -> bool:
+        return (since is None or at >= since) and (until is None or at < until)
+    
+    if inside(recorded_at):
+        yield recorded_at
+    if last_seen_at is None or last_seen_at <= recorded_at:
+        return
+    
+    width = BUCKET_WIDTHS[granularity]
+    at = _bucket_start(recorded_at, granularity) + width
+    if since is not None and at < since:
+        at = _bucket_start(since, granularity) # skip the buckets before the window
+    last_bucket = _bucket_start(last_seen_at, granularity)
+    while at < last_bucket and (until is None or at < until):
+        if inside(at):
+            yield at
+        at += width
+    if inside(last_seen_at):
+        yield last_seen_at
+
+def _aggregate_runs(
+    runs: Iterable, key: str, granularity: RollupGranularity,
+    since: Optional[datetime] = None, until: Optional[datetime] = None
+) -> List[dict]:
+    """Rollup rows for stored history rows (product_id, product_url_id, price, recorded_at, last_seen_at)."""
+    buckets: Dict[tuple, dict] = {}
+    for run in runs:
+        owner = getattr(run, key)
+        if owner is None:
+            continue
+        for at in _run_sightings(run.recorded_at, run.last_seen_at, granularity, since, until):
+            _fold_sighting(buckets, key, owner, granularity, run.price, at)
+    return _sorted_rollups(buckets)
+
+async def upsert_price_rollups(db: AsyncSession, rows: List[PriceHistoryCreate]):
+    """
+    Fold newly observed prices into the hourly and daily rollups, per product and per
+    product URL. Every observation counts, including ones PRICE_HISTORY_MODE did not
+    store as a row. Aggregated in Python first, then one upsert per table; no commit.
+    """
+    if not rows or not settings.PRICE_ROLLUPS_ENABLED:
+        return
+    
+    for model, key_column, key in ROLLUP_MODELS:
+        values_ = _aggregate_rollups(rows, key)
+        if not values_:
+            continue
+        stmt = insert(model).values(values_)
+        new = stmt.excluded
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[key_column, model.granularity, model.bucket_start],
+            set_={
+                "min_price": func.least(model.min_price, new.min_price),
+                "max_price": func.greatest(model.max_price, new.max_price),
+                "first_price": case((new.first_at < model.first_at, new.first_price), else_=model.first_price),
+                "first_at": func.least(model.first_at, new.first_at),
+                "last_price": case((new.last_at >= model.last_at, new.last_price), else_=model.last_price),
+                "last_at": func.greatest(model.last_at, new.last_at),
+                "sample_count": model.sample_count + new.sample_count,
+                "price_sum": model.price_sum + new.price_sum,
+            }
+        ))
+
+async def delete_price_rollups(
+    db: AsyncSession,
+    granularity: RollupGranularity,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+):
+    """Delete one granularity's buckets starting in [since, until) from both rollup tables. Does not commit."""
+    for model, _, _ in ROLLUP_MODELS:
+        stale = delete(model).where(model.granularity == granularity.value)
+        if since is not None:
+            stale = stale.where(model.bucket_start >= since)
+        if until is not None:
+            stale = stale.where(model.bucket_start < until)
+        await db.execute(stale)
+
+async def rebuild_price_rollups(
+    db: AsyncSession,
+    granularity: RollupGranularity,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    replace: bool = False,
+    page_size: int = 50
+) -> int:
+    """
+    Fill one granularity of both rollup tables from price_history, for buckets in
+    [since, until) (unbounded when None). Each stored row counts as seen at recorded_at,
+    at the start of every bucket its run spans and at last_seen_at (_run_sightings).
+    
+    With PRICE_HISTORY_MODE "every_scrape" that reproduces the incremental rollups. With
+    "on_change" the unchanged scrapes inside a run were never stored: every bucket is
+    there with the right min/max prices (and first/last, per URL), but sample_count and
+    price_sum are lower. So by default only missing buckets are written and the ones
+    upsert_price_rollups maintains are left alone; `replace` deletes the range first.
+    Works `page_size` products at a time, committing after each page.
+    Returns the number of rollup rows written.
+    """
+    since = _bucket_start(since, granularity) if since is not None else None
+    until = _bucket_start(until, granularity) if until is not None else None
+    
+    if replace:
+        await delete_price_rollups(db, granularity, since, until)
+        await db.commit()
+    
+    written = 0
+    last_product = None
+    while True:
+        products = select(Product.id).order_by(Product.id).limit(page_size)
+        if last_product is not None:
+            products = products.where(Product.id > last_product)
+        product_ids = (await db.execute(products)).scalars().all()
+        if not product_ids:
+            return written
+        last_product = product_ids[-1]
+        
+        runs = select(
+            PriceHistory.product_id, PriceHistory.product_url_id, PriceHistory.price,
+            PriceHistory.recorded_at, PriceHistory.last_seen_at
+        ).where(PriceHistory.product_id.in_(product_ids))
+        if until is not None:
+            runs = runs.where(PriceHistory.recorded_at < until)
+        if since is not None:
+            # a run that began earlier may still cover the window
+            runs = runs.where(func.coalesce(PriceHistory.last_seen_at, PriceHistory.recorded_at) >= since)
+        runs = (await db.execute(runs.order_by(PriceHistory.product_id, PriceHistory.recorded_at))).all()
+        
+        for model, key_column, key in ROLLUP_MODELS:
+            rollups = _aggregate_runs(runs, key, granularity, since, until)
+            for start in range(0, len(rollups), 1000):
+                result = await db.execute(
+                    insert(model)
+                    .values(rollups[start:start + 1000])
+                    .on_conflict_do_nothing(index_elements=[key_column, model.granularity, model.bucket_start])
+                )
+                written += result.rowcount
+        await db.commit()
+
+async def get_price_rollups(
+    db: AsyncSession,
+    product_id: UUID,
+    granularity: RollupGranularity,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    product_url_id: Optional[UUID] = None
+) -> List[PriceRollupInDB]:
+    """A product's (or one of its URLs') rollup buckets in [start, end), oldest first."""
+    if product_url_id is not None:
+        model = ProductURLPriceRollup
+        stmt = (
+            select(model)
+            .join(ProductURL, ProductURL.id == model.product_url_id)
+            .where(model.product_url_id == product_url_id)
+            .where(ProductURL.product_id == product_id) # only URLs of this product
+        )
+    else:
+        model = ProductPriceRollup
+        stmt = select(model).where(model.product_id == product_id)
+    stmt = stmt.where(model.granularity == granularity.value)
+    if start is not None:
+        stmt = stmt.where(model.bucket_start >= _bucket_start(start, granularity))
+    if end is not None:
+        stmt = stmt.where(model.bucket_start < end)
+    
+    results = await db.execute(stmt.order_by(model.bucket_start))
+    return [PriceRollupInDB.model_validate(r) for r in results.scalars().all()]
+
+#------ SCRAPE QUEUE ------
+SCRAPE_JOB_COLUMNS = (
+    ProductURL.id, ProductURL.product_id, ProductURL.url, ProductURL.retailer, ProductURL.canonical_key
+)
+
+async def iter_product_url_pages(db: AsyncSession, page_size: int) -> AsyncIterator[List[tuple]]:
+    """
+    Every product URL as (id, product_id, url, retailer, canonical_key) rows,
+    `page_size` at a time. Keyset-paged on (canonical_key, id), so each page is an
+    index range scan, URLs for the same page come out next to each other and the
+    session's identity map never sees an ORM instance.
+    """
+    last = None
+    while True:
+        stmt = (
+            select(*SCRAPE_JOB_COLUMNS)
+            .order_by(ProductURL.canonical_key, ProductURL.id)
+            .limit(page_size)
+        )
+        if last is not None:
+            stmt = stmt.where(tuple_(ProductURL.canonical_key, ProductURL.id) > last)
+        
+        rows = (await db.execute(stmt)).all()
+        if not rows:
+            return
+        yield rows
+        last = (rows[-1].canonical_key, rows[-1].id)
+
+def _lease_until():
+    return func.now() + func.make_interval(0, 0, 0, 0, 0, 0, settings.SCRAPE_LEASE_SECONDS)
+
+async def claim_due_product_urls(db: AsyncSession, owner: str, limit: int) -> List[tuple]:
+    """
+    Lease up to `limit` due URLs to `owner`, oldest first, plus every other free URL
+    with the same canonical key so a shared page is fetched once for all of them.
+    Rows locked by another claimer are skipped (FOR UPDATE SKIP LOCKED) and leased
+    rows stay invisible to other workers until the lease is released or expires, so
+    concurrent workers never fetch the same URL.
+    Returns (id, product_id, url, retailer, canonical_key) rows.
+    """
+    unleased = (ProductURL.lease_expires_at.is_(None)) | (ProductURL.lease_expires_at < func.now())
+    due = (
+        select(ProductURL.id, ProductURL.canonical_key)
+        .where(ProductURL.next_check_at <= func.now())
+        .where(unleased)
+        .order_by(ProductURL.next_check_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .cte("due")
+    )
+    siblings = (
+        select(ProductURL.id)
+        .where(ProductURL.canonical_key.in_(select(due.c.canonical_key)))
+        .where(unleased)
+        .with_for_update(skip_locked=True)
+        .cte("siblings")
+    )
+    
+    result = await db.execute(
+        update(ProductURL)
+        .where(ProductURL.id.in_(union(select(due.c.id), select(siblings.c.id))))
+        .values(lease_owner=owner, lease_expires_at=_lease_until())
+        .returning(*SCRAPE_JOB_COLUMNS)
+        .execution_options(synchronize_session=False)
+    )
+    rows = result.all()
+    await db.commit()
+    return rows
+
+async def extend_product_url_leases(db: AsyncSession, owner: str, pu_ids: List[UUID]) -> int:
+    """Heartbeat: push the leases `owner` still holds forward. Returns how many it still holds."""
+    if not pu_ids:
+        return 0
+    
+    result = await db.execute(
+        update(ProductURL)
+        .where(ProductURL.id.in_(pu_ids))
+        .where(ProductURL.lease_owner == owner)
+        .values(lease_expires_at=_lease_until())
+        .returning(ProductURL.id)
+        .execution_options(synchronize_session=False)
+    )
+    held = len(result.all())
+    await db.commit()
+    return held
+
+async def release_product_urls(
+    db: AsyncSession, owner: str, pu_ids: List[UUID], retry_after: Optional[Dict[UUID, float]] = None
+):
+    """
+    Finish `owner`'s leases: clear them and schedule the next check. The interval
+    (with jitter) is the product's own check_interval, else the URL's volatility-based
+    one, else SCRAPE_DEFAULT_INTERVAL. URLs in `retry_after` (no price this time: a
+    failed fetch or an open breaker) are due again after that many seconds instead.
+    Leases taken over by another worker are left alone.
+    """
+    if not pu_ids:
+        return
+    retry_after = retry_after or {}
+    
+    jitter = 1 - settings.SCRAPE_INTERVAL_JITTER + func.random() * 2 * settings.SCRAPE_INTERVAL_JITTER
+    released = dict(lease_owner=None, lease_expires_at=None)
+    
+    observed = [pu_id for pu_id in pu_ids if pu_id not in retry_after]
+    if observed:
+        interval = func.coalesce(
+            Product.check_interval, ProductURL.check_interval, settings.SCRAPE_DEFAULT_INTERVAL
+        )
+        await db.execute(
+            update(ProductURL)
+            .where(ProductURL.product_id == Product.id)
+            .where(ProductURL.id.in_(observed))
+            .where(ProductURL.lease_owner == owner)
+            .values(
+                next_check_at=func.now() + func.make_interval(0, 0, 0, 0, 0, 0, interval * jitter),
+                **released
+            )
+            .execution_options(synchronize_session=False)
+        )
+    if retry_after:
+        retries = values(
+            column("id", PG_UUID(as_uuid=True)), column("delay", Float), name="retries"
+        ).data(list(retry_after.items()))
+        await db.execute(
+            update(ProductURL)
+            .where(ProductURL.id == retries.c.id)
+            .where(ProductURL.lease_owner == owner)
+            .values(
+                next_check_at=func.now() + func.make_interval(0, 0, 0, 0, 0, 0, retries.c.delay * jitter),
+                **released
+            )
+            .execution_options(synchronize_session=False)
+        )
+    await db.commit()
+
+async def update_url_volatility(db: AsyncSession, scores: Dict[UUID, float]):
+    """
+    Fold one change score (0..1) per URL into its volatility EWMA and derive its
+    check interval, spread geometrically between SCRAPE_MAX_INTERVAL (volatility 0)
+    and SCRAPE_MIN_INTERVAL (volatility 1). A URL that just got busier is also
+    pulled forward if its next check is further away than the new interval.
+    Single UPDATE ... FROM (VALUES ...), does not commit.
+    """
+    if not scores:
+        return
+    
+    observed = values(
+        column("id", PG_UUID(as_uuid=True)), column("score", Float), name="observed"
+    ).data(list(scores.items()))
+    alpha = settings.SCRAPE_VOLATILITY_ALPHA
+    volatility = (
+        func.coalesce(ProductURL.volatility, settings.SCRAPE_INITIAL_VOLATILITY) * (1 - alpha)
+        + observed.c.score * alpha
+    )
+    low, high = settings.SCRAPE_MIN_INTERVAL, settings.SCRAPE_MAX_INTERVAL
+    interval = cast(func.round(low * func.power(high / low, 1 - volatility)), Integer)
+    
+    await db.execute(
+        update(ProductURL)
+        .where(ProductURL.id == observed.c.id)
+        .values(
+            volatility=volatility,
+            check_interval=interval,
+            next_check_at=func.least(
+                ProductURL.next_check_at, func.now() + func.make_interval(0, 0, 0, 0, 0, 0, interval)
+            )
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+#------ SCRAPE CACHE CRUD ------
+async def get_scrape_cache(db: AsyncSession, pu_ids: List[UUID]) -> Dict[UUID, ScrapeCacheInDB]:
+    if not pu_ids:
+        return {}
+    
+    results = await db.execute(select(ScrapeCache).where(ScrapeCache.product_url_id.in_(pu_ids)))
+    return {
+        entry.product_url_id: ScrapeCacheInDB.model_validate(entry)
+        for entry in results.scalars().all()
+    }
+
+async def bulk_upsert_scrape_cache(db: AsyncSession, rows: List[ScrapeCacheUpsert]):
+    """Insert or overwrite cache entries. Does not commit; the caller's next commit does."""
+    if not rows:
+        return
+    
+    stmt = insert(ScrapeCache).values([row.model_dump() for row in rows])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ScrapeCache.product_url_id],
+        set_={
+            "etag": stmt.excluded.etag,
+            "last_modified": stmt.excluded.last_modified,
+            "last_price": stmt.excluded.last_price,
+            "content_hash": stmt.excluded.content_hash,
+            "updated_at": func.now(),
+        }
+    )
+    await db.execute(stmt)
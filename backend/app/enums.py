@@ -8,4 +8,9 @@ class ResponseStatus(str, Enum):
 class UserRole(str, Enum):
     """Allowed values for the user `role` field."""
     USER = "user"
-    ADMIN = "admin"
\ No newline at end of file
+    ADMIN = "admin"
+    
+class RollupGranularity(str, Enum):
+    """Bucket sizes kept in the price rollup tables (date_trunc field names)."""
+    HOUR = "hour"
+    DAY = "day"
@@ -1,16 +1,35 @@
+import logging
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
-from app.database import Base, engine
+from sqlalchemy.exc import SQLAlchemyError
+from app.database import Base, SessionLocal, engine
 from app.schemas import ResponseModel, ResponseStatus
 from app.routers import product, productUrl, priceHistory, scrape
 from app.scheduler import init_scheduler, shutdown_scheduler
+from app.services.scraper import open_http_client, close_http_client
+from app.services.extraction_pool import open_extraction_pool, close_extraction_pool
+from app.services.partitions import ensure_price_history_partitions
+from app.utils.config.settings import settings
+
+logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Create tables if they don't exist (only on startup)
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    async with SessionLocal() as db:
+        try:
+            await ensure_price_history_partitions(db) # price_history is partitioned by month
+        except SQLAlchemyError:
+            # rows still land in the default partition; the daily maintenance job retries
+            logger.exception("could not create price_history partitions")
+
+    # Shared, pooled HTTP client for the scraper
+    await open_http_client()
+    if settings.SCHEDULER_RUN_SCRAPES:
+        open_extraction_pool() # small per process; otherwise opened on a first manual scrape
 
     # Start the scheduler
     init_scheduler()
@@ -19,6 +38,8 @@ async def lifespan(app: FastAPI):
         yield
     finally:
         await shutdown_scheduler() # stops APScheduler cleanly
+        await close_http_client() # closes pooled scraper connections
+        close_extraction_pool() # stops the parser workers
         await engine.dispose() # closes all connections in the pool
     
 app = FastAPI(
@@ -1,5 +1,5 @@
 from sqlalchemy import (
-    Boolean, String, Float, ForeignKey, DateTime, func, Index, UniqueConstraint, Enum as SqlEnum
+    Boolean, String, Float, Integer, ForeignKey, DateTime, func, Index, UniqueConstraint, Enum as SqlEnum
 )
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from sqlalchemy.dialects.postgresql import UUID
@@ -8,6 +8,7 @@ from uuid import uuid4
 from typing import List, Optional
 from app.database import Base
 from app.enums import UserRole
+from app.utils.urls import canonical_url
 
 #----- USER MODEL --------------------------------
 class User(Base):
@@ -45,8 +46,18 @@ class ProductURL(Base):
         nullable=False
     )
     url: Mapped[str] = mapped_column(String, unique=True, nullable=False, index=True)
+    canonical_key: Mapped[str] = mapped_column( # same page under any URL variant, see canonical_url
+        String, nullable=False, default=lambda ctx: canonical_url(ctx.get_current_parameters()["url"])
+    )
     is_primary: Mapped[bool] = mapped_column(default=False)
     retailer: Mapped[str] = mapped_column(String(50), nullable=True)
+    next_check_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    check_interval: Mapped[Optional[int]] = mapped_column(Integer, nullable=True) # seconds, adapted to volatility
+    volatility: Mapped[Optional[float]] = mapped_column(Float, nullable=True) # 0 = never moves, 1 = moves every check
+    lease_owner: Mapped[Optional[str]] = mapped_column(String(100), nullable=True) # scrape worker holding it
+    lease_expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
     
     #----- Relationships --------------------------------
     product: Mapped["Product"] = relationship("Product", back_populates="urls")
@@ -58,6 +69,8 @@ class ProductURL(Base):
     __table_args__ = (
         UniqueConstraint("product_id", "url", name="uq_product_url"),
         Index("ix_product_urls_product_id", "product_id"),
+        Index("ix_product_urls_next_check_at", "next_check_at"),
+        Index("ix_product_urls_canonical_key_id", "canonical_key", "id"),
     )
     
 
@@ -77,6 +90,7 @@ class Product(Base):
     name: Mapped[str] = mapped_column(String(255), nullable=False, index=True)
     target_price: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
     current_price: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    check_interval: Mapped[Optional[int]] = mapped_column(Integer, nullable=True) # seconds
     last_checked: Mapped[Optional[datetime]] = mapped_column(
         DateTime(timezone=True), nullable=True
     )
@@ -125,9 +139,11 @@ class PriceHistory(Base):
         nullable=True
     )
     price: Mapped[float] = mapped_column(Float, nullable=False)
-    recorded_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), server_default=func.now(), nullable=False
+    recorded_at: Mapped[datetime] = mapped_column( # partition key, so part of the primary key
+        DateTime(timezone=True), primary_key=True, server_default=func.now(), nullable=False
     )
+    # last scrape that still saw this price; the row covers recorded_at..last_seen_at
+    last_seen_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
     
     #----- Relationships --------------------------------
     product: Mapped["Product"] = relationship("Product", back_populates="price_histories")
@@ -140,6 +156,57 @@ class PriceHistory(Base):
         Index("ix_price_history_product_recorded", "product_id", "recorded_at"),
         Index("ix_price_history_product_url_recorded", "product_url_id", "recorded_at"),
         UniqueConstraint("product_url_id", "recorded_at", name="uq_price_once_per_url_time"),
+        # monthly partitions, see app/services/partitions.py
+        {"postgresql_partition_by": "RANGE (recorded_at)"},
+    )
+
+
+#----- SCRAPE CACHE MODEL --------------------------------
+class ScrapeCache(Base):
+    __tablename__ = "scrape_cache"
+    
+    product_url_id: Mapped[UUID] = mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("product_urls.id", ondelete="CASCADE"),
+        primary_key=True,
+        nullable=False
+    )
+    etag: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    last_modified: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    last_price: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    content_hash: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
+    )
+
+
+#----- PRICE ROLLUP MODELS --------------------------------
+class PriceRollupColumns:
+    """Aggregates over every price observed in one bucket (see RollupGranularity)."""
+    
+    granularity: Mapped[str] = mapped_column(String(4), primary_key=True)
+    bucket_start: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    min_price: Mapped[float] = mapped_column(Float, nullable=False)
+    max_price: Mapped[float] = mapped_column(Float, nullable=False)
+    first_price: Mapped[float] = mapped_column(Float, nullable=False)
+    first_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    last_price: Mapped[float] = mapped_column(Float, nullable=False)
+    last_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    sample_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    price_sum: Mapped[float] = mapped_column(Float, nullable=False)
+
+class ProductPriceRollup(PriceRollupColumns, Base):
+    __tablename__ = "product_price_rollups"
+    
+    product_id: Mapped[UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("products.id", ondelete="CASCADE"), primary_key=True
+    )
+
+class ProductURLPriceRollup(PriceRollupColumns, Base):
+    __tablename__ = "product_url_price_rollups"
+    
+    product_url_id: Mapped[UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("product_urls.id", ondelete="CASCADE"), primary_key=True
     )
 
 
@@ -0,0 +1,56 @@
+"""
+Backfill the hourly/daily price rollup tables from price_history.
+
+New prices keep the rollups current on their own; run this once after enabling
+them on an existing database, or to fill buckets that are missing. By default only
+missing buckets are written, so the incrementally maintained ones are never touched.
+
+--replace deletes and recomputes the range instead. Only do that where the rollups
+were never maintained or history was stored with PRICE_HISTORY_MODE=every_scrape:
+with on_change, the unchanged scrapes inside a run were not stored, so recomputed
+buckets have the right min/max prices but lower sample counts and sums than the
+live ones.
+
+    python -m app.rebuild_rollups                            # everything, both granularities
+    python -m app.rebuild_rollups --granularity day --since 2025-01-01
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timezone
+from app import crud
+from app.database import SessionLocal, engine
+from app.enums import RollupGranularity
+
+async def rebuild(
+    granularities: list[RollupGranularity], since: datetime | None, until: datetime | None, replace: bool
+):
+    try:
+        async with SessionLocal() as db:
+            for granularity in granularities:
+                written = await crud.rebuild_price_rollups(db, granularity, since, until, replace=replace)
+                print(f"{granularity.value}: {written} rollup rows written")
+    finally:
+        await engine.dispose()
+
+def _utc(value: datetime | None) -> datetime | None:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--granularity", choices=[g.value for g in RollupGranularity] + ["all"], default="all")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="ISO date/time (UTC if no offset)")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="ISO date/time, exclusive (UTC if no offset)")
+    parser.add_argument("--replace", action="store_true", help="delete and recompute the range (see above)")
+    args = parser.parse_args(argv)
+
+    granularities = list(RollupGranularity) if args.granularity == "all" else [RollupGranularity(args.granularity)]
+
+    engine.echo = False
+    asyncio.run(rebuild(granularities, _utc(args.since), _utc(args.until), args.replace))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
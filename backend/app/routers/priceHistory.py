@@ -1,10 +1,17 @@
-from fastapi import APIRouter, Depends, status
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Literal, Optional
+from uuid import UUID
 from app import crud
 from app.database import get_db
-from app.schemas import PriceHistoryInDB, PriceHistoryCreate, ResponseModel
+from app.enums import RollupGranularity
+from app.schemas import (
+    PriceHistoryInDB, PriceHistoryCreate, PriceHistoryPage, PricePoint, PriceRollupInDB, ResponseModel
+)
+from app.services.price_series import downsample_series, grid_step
 from app.utils.core.deps import get_current_user
+from app.utils.pagination import decode_cursor, encode_cursor
 from app.utils.response import success_response, error_response
 
 router = APIRouter(prefix="/price-history", tags=["Price History"])
@@ -17,6 +24,11 @@ router = APIRouter(prefix="/price-history", tags=["Price History"])
 )
 async def create_price_history(data: PriceHistoryCreate, db: AsyncSession = Depends(get_db)):
     new_price_history = await crud.create_price_history(db=db, data=data)
+    if new_price_history is None:
+        return error_response(
+            message="Product not found.",
+            status_code=status.HTTP_404_NOT_FOUND
+        )
     return success_response(
         message="Price history record created successfully.",
         data=new_price_history,
@@ -25,14 +37,123 @@ async def create_price_history(data: PriceHistoryCreate, db: AsyncSession = Depe
     
 @router.get(
     "/product/{product_id}",
-    response_model=ResponseModel[List[PriceHistoryInDB]],
+    response_model=ResponseModel[PriceHistoryPage],
     dependencies=[Depends(get_current_user)]
 )
-async def get_price_history_by_product(product_id: str, db: AsyncSession = Depends(get_db)):
-    price_history_records = await crud.get_price_history_by_product(db=db, product_id=product_id)
+async def get_price_history_by_product(
+    product_id: UUID,
+    start: Optional[datetime] = Query(None, alias="from", description="inclusive"),
+    end: Optional[datetime] = Query(None, alias="to", description="exclusive"),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    order: Literal["asc", "desc"] = "asc",
+    product_url_id: Optional[UUID] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    A product's price history, a page at a time, ordered by recorded_at. Rows are
+    price runs, so the one in effect at `from` is included even if it began earlier.
+    """
+    # query times without an offset are UTC, like the stored ones
+    start = start.replace(tzinfo=timezone.utc) if start and start.tzinfo is None else start
+    end = end.replace(tzinfo=timezone.utc) if end and end.tzinfo is None else end
+    
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        return error_response(
+            message="Invalid cursor.",
+            status_code=status.HTTP_400_BAD_REQUEST
+        )
+    
+    price_history_records = await crud.get_price_history_by_product(
+        db=db,
+        product_id=product_id,
+        start=start,
+        end=end,
+        limit=limit,
+        after=after,
+        descending=order == "desc",
+        product_url_id=product_url_id
+    )
+    next_cursor = None
+    if len(price_history_records) == limit:
+        last = price_history_records[-1]
+        next_cursor = encode_cursor(last.recorded_at, last.id)
+        
     return success_response(
         message="Price history records retrieved successfully.",
-        data=price_history_records
+        data=PriceHistoryPage(items=price_history_records, next_cursor=next_cursor)
+    )
+    
+@router.get(
+    "/product/{product_id}/series",
+    response_model=ResponseModel[List[PricePoint]],
+    dependencies=[Depends(get_current_user)]
+)
+async def get_price_series_by_product(
+    product_id: UUID,
+    start: Optional[datetime] = Query(None, alias="from", description="inclusive"),
+    end: Optional[datetime] = Query(None, alias="to", description="exclusive"),
+    points: int = Query(500, ge=3, le=5000, description="maximum points per product URL"),
+    step: Optional[int] = Query(None, ge=60, description="expand to one point per `step` seconds first"),
+    product_url_id: Optional[UUID] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Downsampled (LTTB) price series for charts, whatever PRICE_HISTORY_MODE stored.
+    With `step`, the window defaults to the `points` steps up to now, and `step` is
+    widened when the window would hold more than a few grid points per output point.
+    """
+    # query times without an offset are UTC, like the stored ones
+    start = start.replace(tzinfo=timezone.utc) if start and start.tzinfo is None else start
+    end = end.replace(tzinfo=timezone.utc) if end and end.tzinfo is None else end
+    
+    grid = None
+    if step:
+        grid = timedelta(seconds=step)
+        end = end or datetime.now(timezone.utc)
+        start = start or end - grid * points
+        if start >= end:
+            return error_response(
+                message="`from` must be before `to`.",
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+        grid = grid_step(start, end, grid, points)
+    
+    runs = await crud.get_price_runs(
+        db=db, product_id=product_id, start=start, end=end, product_url_id=product_url_id
+    )
+    return success_response(
+        message="Price series retrieved successfully.",
+        data=downsample_series(runs, points, start, end, grid)
+    )
+    
+@router.get(
+    "/product/{product_id}/rollups",
+    response_model=ResponseModel[List[PriceRollupInDB]],
+    dependencies=[Depends(get_current_user)]
+)
+async def get_price_rollups_by_product(
+    product_id: UUID,
+    granularity: RollupGranularity = RollupGranularity.DAY,
+    start: Optional[datetime] = Query(None, alias="from", description="inclusive"),
+    end: Optional[datetime] = Query(None, alias="to", description="exclusive"),
+    product_url_id: Optional[UUID] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Hourly or daily min/max/first/last/avg buckets, for dashboards and long ranges."""
+    rollups = await crud.get_price_rollups(
+        db=db,
+        product_id=product_id,
+        granularity=granularity,
+        start=start,
+        end=end,
+        product_url_id=product_url_id
+    )
+    return success_response(
+        message="Price rollups retrieved successfully.",
+        data=rollups
     )
     
 @router.get(
@@ -5,6 +5,10 @@ from app.crud import get_product_by_id
 from app.database import get_db
 from app.enums import UserRole
 from app.models import User
+from app.services import scrape_metrics
+from app.services.circuit_breaker import breaker_states
+from app.services.latency import latency_states
+from app.services.rate_limit import limiter_states
 from app.services.scrape_service import scrape_product, scrape_all_products
 from app.utils.response import success_response, error_response
 from app.utils.core.deps import get_current_user, get_current_staff
@@ -30,11 +34,28 @@ async def scrape_all(db: AsyncSession = Depends(get_db)):
         message="All products scraped successfully.",
         data=ScrapeAllResponse(
             status="SUCCESS",
-            count=len(scraped_data),
-            results=scraped_data
+            count=len(scraped_data["results"]),
+            **scraped_data
         )
     )
     
+@router.get(
+    "/stats",
+    response_model=ResponseModel[dict],
+    dependencies=[Depends(get_current_staff)]
+)
+async def scrape_stats():
+    """Scraper counters and per-host limiter, breaker and latency state for this process."""
+    return success_response(
+        message="Scrape stats retrieved successfully.",
+        data={
+            **scrape_metrics.snapshot(),
+            "hosts": limiter_states(),
+            "breakers": breaker_states(),
+            "latency": latency_states()
+        }
+    )
+    
 @router.post(
     "/{product_id}", response_model=ResponseModel[ScrapeProductResponse]
 )
@@ -1,25 +1,67 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from app.database import SessionLocal
-from app.services.scrape_service import scrape_all_products
+from app.services.leader import LeaderElection
+from app.services.partitions import apply_price_history_retention, ensure_price_history_partitions
+from app.services.scrape_service import scrape_due
+from app.services.scraper import http_client_session
+from app.utils.config.settings import settings
 
 scheduler = AsyncIOScheduler()
 
+# with several API workers only the lock holder runs jobs; the rest stay paused
+leader = LeaderElection(
+    settings.SCHEDULER_LEADER_LOCK_ID,
+    settings.SCHEDULER_LEADER_CHECK_SECONDS,
+    on_elected=scheduler.resume,
+    on_deposed=scheduler.pause
+)
+
 async def scrape_job():
+    """
+    Scrape whatever is due now, a batch at a time. Runs every few seconds so load
+    follows each URL's next_check_at instead of arriving as one hourly sweep.
+    """
+    # reuses the app's pooled client, or owns one for a standalone run
+    async with http_client_session(), SessionLocal() as db:
+        for _ in range(settings.SCHEDULER_MAX_BATCHES_PER_TICK):
+            claimed = await scrape_due(db, settings.SCHEDULER_DUE_BATCH_SIZE)
+            if claimed < settings.SCHEDULER_DUE_BATCH_SIZE:
+                break
+        
+async def price_history_maintenance_job():
+    """Create upcoming price_history partitions and retire expired ones."""
     async with SessionLocal() as db:
-        await scrape_all_products(db)
+        await ensure_price_history_partitions(db)
+        await apply_price_history_retention(db)
         
 def init_scheduler():
+    # leave the queue to dedicated scrape workers (python -m app.scrape_worker) when configured
+    if settings.SCHEDULER_RUN_SCRAPES:
+        scheduler.add_job(
+            scrape_job,
+            'interval',
+            seconds=settings.SCHEDULER_POLL_SECONDS,
+            id='scrape_job',
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1
+        )
     scheduler.add_job(
-        scrape_job,
-        'interval',
-        hours=1,
-        id='scrape_job',
+        price_history_maintenance_job,
+        'cron',
+        hour=3,
+        id='price_history_maintenance_job',
         replace_existing=True,
         coalesce=True,
         max_instances=1
     )
-    scheduler.start()
+    if settings.SCHEDULER_LEADER_ELECTION:
+        scheduler.start(paused=True)
+        leader.start()
+    else:
+        scheduler.start()
     
 async def shutdown_scheduler():
+    await leader.stop()
     if scheduler.running:
         scheduler.shutdown()
\ No newline at end of file
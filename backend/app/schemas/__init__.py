@@ -1,5 +1,7 @@
 from app.schemas.response import ResponseModel, ResponseStatus
 from app.schemas.user import UserCreate, UserUpdateEmail, UserUpdate, UserOut
 from app.schemas.product import ProductCreate, ProductUpdate, ProductInDB
-from app.schemas.priceHistory import PriceHistoryInDB, PriceHistoryCreate
-from app.schemas.productUrl import ProductUrlInDB, ProductUrlCreate, ProductUrlUpdate
\ No newline at end of file
+from app.schemas.priceHistory import PriceHistoryInDB, PriceHistoryCreate, PriceHistoryPage, PricePoint
+from app.schemas.productUrl import ProductUrlInDB, ProductUrlCreate, ProductUrlUpdate
+from app.schemas.scrapeCache import ScrapeCacheInDB, ScrapeCacheUpsert
+from app.schemas.priceRollup import PriceRollupInDB
\ No newline at end of file
@@ -1,6 +1,7 @@
 from pydantic import BaseModel
 from uuid import UUID
 from datetime import datetime
+from typing import List, Optional
 
 class PriceHistoryBase(BaseModel):
     product_id: UUID
@@ -13,7 +14,17 @@ class PriceHistoryCreate(PriceHistoryBase):
 
 class PriceHistoryInDB(PriceHistoryBase):
     id: UUID
+    last_seen_at: Optional[datetime] = None # same price seen until then
 
     model_config = {
         "from_attributes": True
     }
+
+class PriceHistoryPage(BaseModel):
+    items: List[PriceHistoryInDB]
+    next_cursor: Optional[str] = None # pass back as `cursor` for the next page
+
+class PricePoint(BaseModel):
+    product_url_id: UUID
+    recorded_at: datetime
+    price: float
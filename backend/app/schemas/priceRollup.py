@@ -0,0 +1,24 @@
+from pydantic import BaseModel, computed_field
+from datetime import datetime
+from app.enums import RollupGranularity
+
+class PriceRollupInDB(BaseModel):
+    granularity: RollupGranularity
+    bucket_start: datetime
+    min_price: float
+    max_price: float
+    first_price: float
+    first_at: datetime
+    last_price: float
+    last_at: datetime
+    sample_count: int
+    price_sum: float
+
+    @computed_field
+    @property
+    def avg_price(self) -> float:
+        return self.price_sum / self.sample_count if self.sample_count else 0.0
+
+    model_config = {
+        "from_attributes": True
+    }
@@ -6,6 +6,7 @@ from datetime import datetime
 class ProductBase(BaseModel):
     name: str
     target_price: Optional[float] = None
+    check_interval: Optional[int] = Field(None, ge=60, description="Seconds between scrapes")
     
 class ProductCreate(ProductBase):
     urls: List[str] = Field(..., min_items=1)
@@ -23,6 +24,7 @@ class ProductUpdate(BaseModel):
     name: Optional[str] = None
     target_price: Optional[float] = None
     current_price: Optional[float] = None
+    check_interval: Optional[int] = Field(None, ge=60)
     
 class ProductInDB(ProductBase):
     id: UUID
@@ -1,6 +1,7 @@
 from pydantic import BaseModel
 from typing import Optional
 from uuid import UUID
+from datetime import datetime
 
 class ProductUrlBase(BaseModel):
     product_id: UUID
@@ -18,6 +19,10 @@ class ProductUrlUpdate(BaseModel):
 
 class ProductUrlInDB(ProductUrlBase):
     id: UUID
+    canonical_key: Optional[str] = None
+    next_check_at: Optional[datetime] = None
+    check_interval: Optional[int] = None
+    volatility: Optional[float] = None
 
     model_config = {
         "from_attributes": True
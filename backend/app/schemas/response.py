@@ -17,6 +17,9 @@ class ScrapedResult(BaseModel):
 class ScrapeAllResponse(BaseModel):
     status: ResponseStatus.SUCCESS
     count: int
+    urls_scraped: int
+    prices_found: int
+    results_truncated: bool # results lists only the first SCRAPE_ALL_RESULTS_LIMIT products
     results: List[ScrapedResult]
     
 class ScrapeProductResponse(BaseModel):
@@ -0,0 +1,18 @@
+from pydantic import BaseModel
+from typing import Optional
+from uuid import UUID
+
+class ScrapeCacheBase(BaseModel):
+    product_url_id: UUID
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    last_price: Optional[float] = None
+    content_hash: Optional[str] = None
+    
+class ScrapeCacheUpsert(ScrapeCacheBase):
+    pass
+
+class ScrapeCacheInDB(ScrapeCacheBase):
+    model_config = {
+        "from_attributes": True
+    }
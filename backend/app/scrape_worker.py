@@ -0,0 +1,83 @@
+"""
+Standalone scrape worker.
+
+Leases batches of due product URLs from Postgres, scrapes them and writes the results.
+Any number of workers can run side by side, on one machine or many: leases are claimed
+with FOR UPDATE SKIP LOCKED and kept alive by heartbeats, so no URL is fetched twice
+and a crashed worker's URLs are picked up again once its leases expire.
+
+    python -m app.scrape_worker                 # run until SIGINT / SIGTERM
+    python -m app.scrape_worker --once          # drain what is due now, then exit
+
+Set SCHEDULER_RUN_SCRAPES=false on the API processes when workers do the scraping.
+"""
+import argparse
+import asyncio
+import logging
+import signal
+import sys
+from app.database import SessionLocal, engine
+from app.services.extraction_pool import close_extraction_pool, open_extraction_pool
+from app.services.scrape_service import WORKER_ID, scrape_due
+from app.services.scraper import close_http_client, open_http_client
+from app.utils.config.settings import settings
+
+logger = logging.getLogger("app.scrape_worker")
+MAX_BACKOFF_SECONDS = 300.0 # between retries while batches keep failing
+
+async def run_worker(owner: str, batch_size: int, poll_seconds: float, once: bool = False):
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    await open_http_client()
+    open_extraction_pool(dedicated=True)
+    logger.info("worker %s started (batch size %d)", owner, batch_size)
+    failures = 0
+    try:
+        async with SessionLocal() as db:
+            while not stopping.is_set():
+                try:
+                    claimed = await scrape_due(db, batch_size, owner)
+                    failures = 0
+                except Exception:
+                    # e.g. the database went away; the batch's leases expire and get retried
+                    failures += 1
+                    logger.exception("scrape batch failed (%d in a row)", failures)
+                    try:
+                        await db.rollback()
+                    except Exception:
+                        logger.exception("rollback after failed batch failed")
+                    claimed = 0
+                if claimed:
+                    logger.info("scraped %d urls", claimed)
+                    continue # more may be due right away
+                if once:
+                    break
+                delay = min(MAX_BACKOFF_SECONDS, poll_seconds * 2 ** failures) if failures else poll_seconds
+                try:
+                    await asyncio.wait_for(stopping.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+    finally:
+        await close_http_client()
+        close_extraction_pool()
+        await engine.dispose()
+        logger.info("worker %s stopped", owner)
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--worker-id", default=WORKER_ID, help="lease owner name (default: host:pid)")
+    parser.add_argument("--batch-size", type=int, default=settings.SCHEDULER_DUE_BATCH_SIZE)
+    parser.add_argument("--poll-seconds", type=float, default=settings.SCHEDULER_POLL_SECONDS)
+    parser.add_argument("--once", action="store_true", help="exit when nothing is due")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    engine.echo = False
+    asyncio.run(run_worker(args.worker_id, args.batch_size, args.poll_seconds, args.once))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
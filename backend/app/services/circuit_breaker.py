@@ -0,0 +1,78 @@
+import time
+from typing import Dict
+from app.services.rate_limit import host_of
+from app.utils.config.settings import settings
+
+class CircuitBreaker:
+    """
+    Per-host breaker. After SCRAPER_BREAKER_THRESHOLD consecutive failures the
+    host is skipped for a cooldown; then a single probe request decides whether
+    it closes again or stays open for a longer (doubled, capped) cooldown.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, threshold: int, cooldown: float, max_cooldown: float):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = self.HALF_OPEN # let exactly one probe through
+            return True
+        return False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.cooldown = self.base_cooldown
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN:
+            self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+            self._open()
+        elif self.failures >= self.threshold:
+            self._open()
+
+    def abandon_probe(self):
+        """The probe ended without an outcome (e.g. cancelled): back to OPEN, next allow() probes again."""
+        if self.state == self.HALF_OPEN:
+            self.state = self.OPEN
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+
+    def retry_in(self) -> float:
+        """Seconds until an OPEN breaker lets a probe through; 0 otherwise."""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+    def status(self) -> dict:
+        return {"state": self.state, "failures": self.failures, "retry_in": round(self.retry_in(), 1)}
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+def get_breaker(url: str) -> CircuitBreaker:
+    host = host_of(url)
+    breaker = _breakers.get(host)
+    if breaker is None:
+        breaker = CircuitBreaker(
+            threshold=settings.SCRAPER_BREAKER_THRESHOLD,
+            cooldown=settings.SCRAPER_BREAKER_COOLDOWN,
+            max_cooldown=settings.SCRAPER_BREAKER_MAX_COOLDOWN,
+        )
+        _breakers[host] = breaker
+    return breaker
+
+def breaker_states() -> dict:
+    return {host: breaker.status() for host, breaker in _breakers.items()}
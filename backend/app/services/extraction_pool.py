@@ -0,0 +1,62 @@
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, NamedTuple
+from app.services.scraper import extract_price
+from app.utils.config.settings import settings
+
+# Parsing is CPU-bound, so it runs off the event loop to keep the API responsive.
+# SCRAPER_PARSE_EXECUTOR picks "process" (scales across cores), "thread" or "inline".
+_executor: Executor | None = None
+
+class PageToParse(NamedTuple):
+    html: bytes
+    retailer: str | None = None
+    url: str | None = None
+
+def _extract_batch(pages: List[PageToParse]) -> List[float | None]:
+    # module-level so it can be pickled into worker processes
+    return [extract_price(page.html, page.retailer, page.url) for page in pages]
+
+def open_extraction_pool(dedicated: bool = False) -> Executor | None:
+    """
+    Start the configured executor. A dedicated scrape worker gets SCRAPER_PARSE_WORKERS
+    (0 = one per CPU core); anything else, e.g. an API process, SCRAPER_API_PARSE_WORKERS.
+    Returns None in inline mode.
+    """
+    global _executor
+    if _executor is not None or settings.SCRAPER_PARSE_EXECUTOR == "inline":
+        return _executor
+
+    if dedicated:
+        workers = settings.SCRAPER_PARSE_WORKERS or os.cpu_count() or 1
+    else:
+        workers = max(1, settings.SCRAPER_API_PARSE_WORKERS)
+    if settings.SCRAPER_PARSE_EXECUTOR == "process":
+        _executor = ProcessPoolExecutor(max_workers=workers)
+    else:
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="extract")
+    return _executor
+
+def close_extraction_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+async def extract_prices(pages: List[PageToParse]) -> List[float | None]:
+    """Extract prices for many pages, submitted to the pool in chunks of SCRAPER_PARSE_BATCH_SIZE."""
+    if not pages:
+        return []
+
+    executor = open_extraction_pool()
+    if executor is None:
+        return _extract_batch(pages)
+
+    loop = asyncio.get_running_loop()
+    size = settings.SCRAPER_PARSE_BATCH_SIZE
+    chunks = await asyncio.gather(*(
+        loop.run_in_executor(executor, _extract_batch, pages[start:start + size])
+        for start in range(0, len(pages), size)
+    ))
+    return [price for chunk in chunks for price in chunk]
@@ -0,0 +1,73 @@
+import math
+from collections import deque
+from typing import Deque, Dict
+from app.services.rate_limit import host_of
+from app.utils.config.settings import settings
+
+class LatencyTracker:
+    """
+    Rolling windows of request latencies (seconds) for one host: full 200 downloads,
+    which the timeout and hedge delay are derived from, and cheap 304 revalidations,
+    kept apart so they don't drag the timeout down.
+    """
+
+    def __init__(self, window: int):
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.revalidations: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def record_revalidation(self, seconds: float):
+        self.revalidations.append(seconds)
+
+    def record_timeout(self, seconds: float, timeout: float):
+        # censored: the real latency is at least the timeout, so a host that slowed
+        # down past it still pushes its p99, and with it the next timeout, upwards
+        self.samples.append(max(seconds, timeout))
+
+    def percentile(self, pct: float) -> float | None:
+        if len(self.samples) < settings.SCRAPER_LATENCY_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+    def timeout(self) -> float:
+        """p99 scaled by SCRAPER_TIMEOUT_MULTIPLIER, clamped; the static timeout until there's data."""
+        p99 = self.percentile(99)
+        if p99 is None:
+            return settings.SCRAPER_TIMEOUT
+        return min(
+            settings.SCRAPER_MAX_TIMEOUT,
+            max(settings.SCRAPER_MIN_TIMEOUT, p99 * settings.SCRAPER_TIMEOUT_MULTIPLIER)
+        )
+
+    def hedge_delay(self) -> float | None:
+        """How long to wait before firing a second request: the host's p95."""
+        if not settings.SCRAPER_HEDGE_REQUESTS:
+            return None
+        return self.percentile(95)
+
+    def state(self) -> dict:
+        p50, p95, p99 = self.percentile(50), self.percentile(95), self.percentile(99)
+        return {
+            "samples": len(self.samples),
+            "revalidations": len(self.revalidations),
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "p99_ms": round(p99 * 1000, 1) if p99 is not None else None,
+            "timeout_s": round(self.timeout(), 2),
+        }
+
+_trackers: Dict[str, LatencyTracker] = {}
+
+def get_latency_tracker(url: str) -> LatencyTracker:
+    host = host_of(url)
+    tracker = _trackers.get(host)
+    if tracker is None:
+        tracker = LatencyTracker(settings.SCRAPER_LATENCY_WINDOW)
+        _trackers[host] = tracker
+    return tracker
+
+def latency_states() -> dict:
+    return {host: tracker.state() for host, tracker in _trackers.items()}
@@ -0,0 +1,92 @@
+import asyncio
+from typing import Callable
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.database import engine
+
+class LeaderElection:
+    """
+    Leader election on a Postgres session-level advisory lock. Every process tries
+    to take the same lock on a dedicated connection; the one that gets it leads
+    until it stops or its connection dies, at which point Postgres frees the lock
+    and the next process to retry takes over.
+    """
+
+    def __init__(
+        self,
+        lock_id: int,
+        interval: float,
+        on_elected: Callable[[], None],
+        on_deposed: Callable[[], None]
+    ):
+        self.lock_id = lock_id
+        self.interval = interval
+        self.on_elected = on_elected
+        self.on_deposed = on_deposed
+        self.is_leader = False
+        self._conn: AsyncConnection | None = None
+        self._task: asyncio.Task | None = None
+
+    def _set_leader(self, leader: bool):
+        if leader == self.is_leader:
+            return
+        self.is_leader = leader
+        (self.on_elected if leader else self.on_deposed)()
+
+    async def _check(self):
+        if self._conn is None:
+            conn = await engine.connect()
+            # no open transaction between checks; the lock belongs to the session
+            self._conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+
+        if self.is_leader:
+            await self._conn.execute(text("SELECT 1")) # still connected means still holding it
+        else:
+            result = await self._conn.execute(
+                text("SELECT pg_try_advisory_lock(:lock_id)"), {"lock_id": self.lock_id}
+            )
+            self._set_leader(bool(result.scalar()))
+
+    async def _drop_connection(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                await conn.invalidate() # never hand a possibly lock-holding connection back to the pool
+            except (SQLAlchemyError, OSError):
+                pass
+
+    async def _run(self):
+        while True:
+            try:
+                await self._check()
+            except (SQLAlchemyError, OSError):
+                # the lock went with the connection, step down and reconnect next round
+                self._set_leader(False)
+                await self._drop_connection()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self.is_leader and self._conn is not None:
+            try:
+                await self._conn.execute(
+                    text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": self.lock_id}
+                )
+            except (SQLAlchemyError, OSError):
+                pass
+        self._set_leader(False)
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
@@ -0,0 +1,171 @@
+import re
+from datetime import datetime, timedelta, timezone
+from typing import List, Tuple
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import crud
+from app.enums import RollupGranularity
+from app.utils.config.settings import settings
+
+PARENT = "price_history"
+DEFAULT = f"{PARENT}_default"
+COLUMNS = "id, product_id, product_url_id, price, recorded_at, last_seen_at"
+PARTITION_NAME = re.compile(r"^price_history_p(\d{4})_(\d{2})$")
+MAINTENANCE_LOCK_ID = 7_140_002 # serialises DDL between processes
+
+def month_start(at: datetime) -> datetime:
+    at = at.astimezone(timezone.utc)
+    return datetime(at.year, at.month, 1, tzinfo=timezone.utc)
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+def partition_name(month: datetime) -> str:
+    return f"{PARENT}_p{month.year:04d}_{month.month:02d}"
+
+async def _relkind(db: AsyncSession, name: str) -> str | None:
+    result = await db.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"), {"name": name})
+    return result.scalar()
+
+async def _is_partitioned(db: AsyncSession) -> bool:
+    # a table created before partitioning was introduced stays a plain heap until
+    # `python -m app.upgrade_schema --partition-price-history` converts it
+    return await _relkind(db, PARENT) == "p"
+
+async def _has_table(db: AsyncSession, name: str) -> bool:
+    return await _relkind(db, name) is not None
+
+async def _monthly_partitions(db: AsyncSession) -> List[Tuple[datetime, str]]:
+    result = await db.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:name)"
+        ),
+        {"name": PARENT}
+    )
+    partitions = []
+    for name in result.scalars().all():
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions.append((datetime(int(match[1]), int(match[2]), 1, tzinfo=timezone.utc), name))
+    return sorted(partitions)
+
+async def _default_has_rows(db: AsyncSession, start: datetime, end: datetime) -> bool:
+    result = await db.execute(
+        text(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT} WHERE recorded_at >= :start AND recorded_at < :end)"),
+        {"start": start, "end": end}
+    )
+    return bool(result.scalar())
+
+async def _create_month(db: AsyncSession, name: str, month: datetime):
+    bounds = f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    if not await _default_has_rows(db, month, add_months(month, 1)):
+        await db.execute(text(f"CREATE TABLE {name} PARTITION OF {PARENT} {bounds}"))
+        return
+
+    # Postgres refuses a partition whose range already has rows in the default one:
+    # take the default out, create the month, move its rows over, put the default back
+    await db.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {DEFAULT}"))
+    await db.execute(text(f"CREATE TABLE {name} PARTITION OF {PARENT} {bounds}"))
+    moved = {"start": month, "end": add_months(month, 1)}
+    await db.execute(
+        text(
+            f"INSERT INTO {name} ({COLUMNS}) SELECT {COLUMNS} FROM {DEFAULT} "
+            f"WHERE recorded_at >= :start AND recorded_at < :end"
+        ),
+        moved
+    )
+    await db.execute(text(f"DELETE FROM {DEFAULT} WHERE recorded_at >= :start AND recorded_at < :end"), moved)
+    await db.execute(text(f"ALTER TABLE {PARENT} ATTACH PARTITION {DEFAULT} DEFAULT"))
+
+async def ensure_price_history_partitions(db: AsyncSession, now: datetime | None = None) -> List[str]:
+    """
+    Create the monthly partitions from this month to PRICE_HISTORY_PARTITIONS_AHEAD months
+    out, plus a default partition for anything outside them. Rows that landed in the
+    default partition for a month being created are moved into it. Idempotent. Returns
+    the partitions it created.
+    """
+    if not await _is_partitioned(db):
+        return []
+
+    await db.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MAINTENANCE_LOCK_ID})
+    existing = {name for _, name in await _monthly_partitions(db)}
+    created = []
+
+    await db.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT} PARTITION OF {PARENT} DEFAULT"))
+    this_month = month_start(now or datetime.now(timezone.utc))
+    for offset in range(settings.PRICE_HISTORY_PARTITIONS_AHEAD + 1):
+        month = add_months(this_month, offset)
+        name = partition_name(month)
+        if name in existing:
+            continue
+        await _create_month(db, name, month)
+        created.append(name)
+
+    await db.commit()
+    return created
+
+async def _retire(db: AsyncSession, source: str, start: datetime, end: datetime):
+    """
+    Backfill the daily rollups for [start, end) and carry runs still open past `end`
+    into a row starting at `end`, so change-only recording keeps a current row per URL.
+    The caller removes the raw rows in the same transaction.
+    """
+    # only missing buckets: the ones upsert_price_rollups kept are exact, a rebuild is not
+    await crud.rebuild_price_rollups(db, RollupGranularity.DAY, since=start, until=end)
+
+    await db.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MAINTENANCE_LOCK_ID})
+    await db.execute(
+        text(
+            f"INSERT INTO {PARENT} ({COLUMNS}) "
+            f"SELECT gen_random_uuid(), product_id, product_url_id, price, :end, last_seen_at "
+            f"FROM {source} WHERE recorded_at >= :start AND recorded_at < :end AND last_seen_at >= :end "
+            f"ON CONFLICT ON CONSTRAINT uq_price_once_per_url_time DO NOTHING"
+        ),
+        {"start": start, "end": end}
+    )
+
+async def apply_price_history_retention(db: AsyncSession, now: datetime | None = None) -> List[str]:
+    """
+    Drop monthly partitions that ended more than PRICE_HISTORY_RETENTION_DAYS ago, and
+    delete rows just as old from the default partition. Before raw rows go, daily
+    rollups missing for their days are backfilled (the rollups are the record that
+    outlives them) and runs still open past the cut are carried forward. Hourly
+    rollups go with the raw rows they summarise; daily ones are kept.
+    Returns the partitions dropped.
+    """
+    if settings.PRICE_HISTORY_RETENTION_DAYS <= 0 or not await _is_partitioned(db):
+        return []
+
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=settings.PRICE_HISTORY_RETENTION_DAYS)
+    expired_before = month_start(cutoff) # whole months only
+    dropped = []
+    for month, name in await _monthly_partitions(db):
+        month_end = add_months(month, 1)
+        if month_end > expired_before:
+            break
+
+        await _retire(db, name, month, month_end)
+        await db.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+        await db.execute(text(f"DROP TABLE {name}"))
+        await crud.delete_price_rollups(db, RollupGranularity.HOUR, until=month_end)
+        await db.commit()
+        dropped.append(name)
+
+    # out-of-window writes (backfills, odd clocks) that landed in the default partition
+    if await _has_table(db, DEFAULT):
+        result = await db.execute(
+            text(f"SELECT min(recorded_at) FROM {DEFAULT} WHERE recorded_at < :before"),
+            {"before": expired_before}
+        )
+        oldest = result.scalar()
+        if oldest is not None:
+            await _retire(db, DEFAULT, oldest, expired_before)
+            await db.execute(
+                text(f"DELETE FROM {DEFAULT} WHERE recorded_at < :before"), {"before": expired_before}
+            )
+    # hourly buckets past the cut whose raw rows were already gone
+    await crud.delete_price_rollups(db, RollupGranularity.HOUR, until=expired_before)
+    await db.commit()
+    return dropped
@@ -0,0 +1,137 @@
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Tuple
+from uuid import UUID
+import numpy as np
+from app.schemas.priceHistory import PriceHistoryInDB, PricePoint
+
+# a `step` grid may hold at most this many points per requested output point
+MAX_GRID_FACTOR = 4
+
+def grid_step(start: datetime, end: datetime, step: timedelta, points: int) -> timedelta:
+    """`step`, widened if needed so [start, end) holds at most MAX_GRID_FACTOR * points grid points."""
+    floor = (end - start) / (MAX_GRID_FACTOR * points)
+    return max(step, timedelta(seconds=math.ceil(floor.total_seconds())))
+
+def _grid_arrays(
+    rows: Iterable[PriceHistoryInDB],
+    step: timedelta,
+    start: datetime | None,
+    end: datetime | None
+) -> Dict[UUID, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Expand run-length history (one row per price change, valid from recorded_at to
+    last_seen_at) back into a regular series: a point every `step` through each run,
+    as if the price had been recorded on every scrape, clipped to start/end. Built
+    as NumPy arrays per product URL, never as per-point objects.
+    """
+    seconds = step.total_seconds()
+    by_url: Dict[UUID, Tuple[list, list]] = {}
+    for row in rows:
+        first = row.recorded_at.timestamp()
+        last = max((row.last_seen_at or row.recorded_at).timestamp(), first)
+        if end is not None:
+            last = min(last, end.timestamp())
+        if start is not None and first < start.timestamp():
+            first += seconds * math.ceil((start.timestamp() - first) / seconds) # first grid point inside
+        if first > last:
+            continue
+
+        count = int((last - first) // seconds) + 1
+        xs, ys = by_url.setdefault(row.product_url_id, ([], []))
+        xs.append(first + seconds * np.arange(count))
+        ys.append(np.full(count, row.price, dtype=np.float64))
+
+    arrays = {}
+    for url_id, (xs, ys) in by_url.items():
+        x, y = np.concatenate(xs), np.concatenate(ys)
+        order = np.argsort(x, kind="stable")
+        arrays[url_id] = (x[order], y[order])
+    return arrays
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: indices of `threshold` points (first and last
+    always kept) that best preserve the visual shape of x/y. One pass over the
+    buckets, each bucket scored with vectorized NumPy.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # threshold - 2 buckets between the fixed first and last points
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    anchor = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        next_x, next_y = x[hi:next_hi].mean(), y[hi:next_hi].mean()
+
+        # twice the triangle area (anchor, candidate, next bucket average)
+        area = np.abs(
+            (x[anchor] - next_x) * (y[lo:hi] - y[anchor])
+            - (x[anchor] - x[lo:hi]) * (next_y - y[anchor])
+        )
+        anchor = lo + int(area.argmax())
+        selected[i + 1] = anchor
+    return selected
+
+def _series_arrays(
+    rows: Iterable[PriceHistoryInDB],
+    start: datetime | None,
+    end: datetime | None
+) -> Dict[UUID, Tuple[np.ndarray, np.ndarray]]:
+    # each run becomes its first and last sighting: a step line with no interpolation
+    by_url: Dict[UUID, list] = {}
+    for row in rows:
+        by_url.setdefault(row.product_url_id, []).append(row)
+
+    arrays = {}
+    for url_id, url_rows in by_url.items():
+        url_rows.sort(key=lambda r: r.recorded_at)
+        first = np.array([r.recorded_at.timestamp() for r in url_rows])
+        last = np.array([(r.last_seen_at or r.recorded_at).timestamp() for r in url_rows])
+        price = np.array([r.price for r in url_rows], dtype=np.float64)
+        if start is not None:
+            first = np.maximum(first, start.timestamp())
+        if end is not None:
+            last = np.minimum(last, end.timestamp())
+
+        x = np.column_stack([first, last]).ravel()
+        y = np.repeat(price, 2)
+        keep = np.ones(len(x), dtype=bool)
+        keep[1::2] = last > first # single sightings need only one point
+        arrays[url_id] = (x[keep], y[keep])
+    return arrays
+
+def downsample_series(
+    rows: Iterable[PriceHistoryInDB],
+    points: int,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    step: timedelta | None = None
+) -> List[PricePoint]:
+    """
+    Chart-ready series: at most `points` points per product URL, chosen with LTTB.
+    Runs are drawn from their first to last sighting, or expanded to a regular
+    grid first when `step` is given (the caller bounds that grid, see grid_step).
+    Output size is bounded by `points` whatever the amount of history.
+    """
+    if step is not None:
+        arrays = _grid_arrays(rows, step, start, end)
+    else:
+        arrays = _series_arrays(rows, start, end)
+
+    series = []
+    for url_id, (x, y) in arrays.items():
+        for i in lttb(x, y, points):
+            series.append(PricePoint(
+                product_url_id=url_id,
+                recorded_at=datetime.fromtimestamp(x[i], timezone.utc),
+                price=float(y[i])
+            ))
+    series.sort(key=lambda p: p.recorded_at)
+    return series
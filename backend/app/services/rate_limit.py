@@ -0,0 +1,123 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict
+from urllib.parse import urlsplit
+from app.utils.config.settings import settings
+
+class HostLimiter:
+    """
+    Token bucket plus an adaptive concurrency limit for one hostname.
+    The limit grows additively while the host answers normally and is cut
+    multiplicatively on 429/503/timeouts (AIMD). Retry-After pauses the host.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        initial_limit: float,
+        max_limit: float,
+        min_limit: float = 1.0
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.limit = initial_limit
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self._refilled_at = time.monotonic()
+        self._changed = asyncio.Event()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _notify(self):
+        # wake every waiter, they re-check their own condition
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self.blocked_until:
+                timeout = self.blocked_until - now
+            elif self.in_flight >= int(self.limit):
+                timeout = None # until a request finishes
+            elif self.tokens < 1:
+                timeout = (1 - self.tokens) / self.rate
+            else:
+                self.tokens -= 1
+                self.in_flight += 1
+                return
+
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def release(self, success: bool | None = None, retry_after: float | None = None):
+        """
+        success=True grows the limit, success=False shrinks it,
+        None (e.g. a 404) leaves it alone.
+        """
+        self.in_flight -= 1
+        if success is True:
+            self.limit = min(self.max_limit, self.limit + settings.SCRAPER_AIMD_INCREASE / self.limit)
+        elif success is False:
+            self.limit = max(self.min_limit, self.limit * settings.SCRAPER_AIMD_DECREASE)
+        if retry_after:
+            retry_after = min(retry_after, settings.SCRAPER_MAX_RETRY_AFTER)
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+        self._notify()
+
+    def state(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "paused_for": round(max(0.0, self.blocked_until - time.monotonic()), 1),
+        }
+
+_limiters: Dict[str, HostLimiter] = {}
+
+def host_of(url: str) -> str:
+    return (urlsplit(url).hostname or "").lower()
+
+def get_host_limiter(url: str) -> HostLimiter:
+    host = host_of(url)
+    limiter = _limiters.get(host)
+    if limiter is None:
+        limiter = HostLimiter(
+            rate=settings.SCRAPER_HOST_RATE,
+            burst=settings.SCRAPER_HOST_BURST,
+            initial_limit=settings.SCRAPER_HOST_INITIAL_CONCURRENCY,
+            max_limit=settings.SCRAPER_MAX_CONNECTIONS_PER_HOST,
+        )
+        _limiters[host] = limiter
+    return limiter
+
+def reset_limiters():
+    _limiters.clear()
+
+def limiter_states() -> dict:
+    return {host: limiter.state() for host, limiter in _limiters.items()}
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Retry-After as seconds, from either delta-seconds or an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
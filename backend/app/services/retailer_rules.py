@@ -0,0 +1,127 @@
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Tuple
+from urllib.parse import urlsplit
+from app.utils.config.settings import settings
+
+DEFAULT_RULES_PATH = Path(__file__).resolve().parents[1] / "data" / "retailer_rules.json"
+AMOUNT_REGEX = re.compile(r"\d[\d.,\s ']*")
+
+@dataclass(frozen=True)
+class RetailerRule:
+    """Where a retailer puts its price, and how it writes the number."""
+    name: str
+    hosts: Tuple[str, ...] = ()
+    selectors: Tuple[str, ...] = ()
+    attribute: str | None = None # read this attribute instead of the node text
+    decimal: str = "." # decimal separator, "." or ","
+    stop_after: str | None = None # stop downloading once this text has been seen
+    drop_params: Tuple[str, ...] = () # query parameters that never change the page here; "pd_rd_*" is a prefix
+    thousands: re.Pattern = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        # compiled once per rule: everything that isn't a digit or the decimal separator
+        object.__setattr__(self, "thousands", re.compile(rf"[^\d{re.escape(self.decimal)}]"))
+
+    def drops_param(self, name: str) -> bool:
+        name = name.lower()
+        return any(
+            name.startswith(param[:-1]) if param.endswith("*") else name == param
+            for param in self.drop_params
+        )
+
+    @property
+    def stop_marker(self) -> bytes | None:
+        return self.stop_after.encode("utf-8") if self.stop_after else None
+
+    def parse_amount(self, text: str | None) -> float | None:
+        if not text:
+            return None
+        match = AMOUNT_REGEX.search(text)
+        if not match:
+            return None
+        cleaned = self.thousands.sub("", match.group(0)).replace(self.decimal, ".")
+        try:
+            return float(cleaned)
+        except ValueError:
+            return None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RetailerRule":
+        return cls(
+            name=data["name"].strip().lower(),
+            hosts=tuple(host.strip().lower() for host in data.get("hosts", [])),
+            selectors=tuple(data.get("selectors", [])),
+            attribute=data.get("attribute"),
+            decimal=data.get("decimal") or ".",
+            stop_after=data.get("stop_after"),
+            drop_params=tuple(param.strip().lower() for param in data.get("drop_params", [])),
+        )
+
+class RuleRegistry:
+    """
+    Rules loaded from a JSON data file and indexed by retailer name and hostname.
+    The file is re-read when its mtime changes (checked at most every
+    SCRAPER_RULES_RELOAD_SECONDS), so edits apply without a restart.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.by_name: Dict[str, RetailerRule] = {}
+        self.by_host: Dict[str, RetailerRule] = {}
+        self._mtime: float | None = None
+        self._checked_at = 0.0
+
+    def _load(self):
+        with open(self.path, encoding="utf8") as fh:
+            data = json.load(fh)
+
+        by_name, by_host = {}, {}
+        for entry in data.get("rules", []):
+            rule = RetailerRule.from_dict(entry)
+            by_name[rule.name] = rule
+            for host in rule.hosts:
+                by_host[host] = rule
+        self.by_name, self.by_host = by_name, by_host
+
+    def refresh(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._checked_at < settings.SCRAPER_RULES_RELOAD_SECONDS:
+            return
+        self._checked_at = now
+
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return # keep whatever was loaded last
+        if force or mtime != self._mtime:
+            try:
+                self._load()
+                self._mtime = mtime
+            except (OSError, ValueError, KeyError):
+                pass # a half-written file; try again on the next check
+
+    def lookup(self, retailer: str | None = None, url: str | None = None) -> RetailerRule | None:
+        self.refresh()
+        if retailer:
+            rule = self.by_name.get(retailer.strip().lower())
+            if rule:
+                return rule
+        if url:
+            host = (urlsplit(url).hostname or "").lower()
+            # walk up the domain: www.shop.example.com -> shop.example.com -> example.com
+            while host:
+                rule = self.by_host.get(host)
+                if rule:
+                    return rule
+                _, _, host = host.partition(".")
+        return None
+
+registry = RuleRegistry(Path(settings.SCRAPER_RULES_PATH or DEFAULT_RULES_PATH))
+
+def get_rule(retailer: str | None = None, url: str | None = None) -> RetailerRule | None:
+    return registry.lookup(retailer, url)
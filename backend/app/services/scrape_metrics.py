@@ -0,0 +1,17 @@
+from collections import Counter
+
+# Process-wide scrape counters, exposed through GET /scrape/stats
+counters: Counter = Counter()
+
+def incr(name: str, amount: int = 1):
+    counters[name] += amount
+
+def snapshot() -> dict:
+    """Current counter values plus derived ratios."""
+    data = dict(counters)
+    lookups = counters["cache_hits"] + counters["cache_misses"]
+    data["cache_hit_ratio"] = counters["cache_hits"] / lookups if lookups else 0.0
+    return data
+
+def reset():
+    counters.clear()
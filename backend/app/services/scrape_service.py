@@ -1,68 +1,359 @@
-from sqlalchemy import func
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timezone
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.models import Product, ProductURL, PriceHistory
-from app.services.scraper import fetch_page, extract_price
+from sqlalchemy.future import select
+from app import crud
+from app.database import SessionLocal
+from app.models import Product, ProductURL
+from app.schemas.priceHistory import PriceHistoryCreate
+from app.schemas.product import ProductInDB
+from app.schemas.scrapeCache import ScrapeCacheInDB, ScrapeCacheUpsert
+from app.services import scrape_metrics
+from app.services.circuit_breaker import get_breaker
+from app.services.extraction_pool import PageToParse, extract_prices
+from app.services.scraper import FetchResult, fetch_conditional
+from app.utils.config.settings import settings
+from app.utils.urls import canonical_url
+from urllib.parse import urlsplit
 from uuid import UUID
-from typing import List
+from typing import AsyncIterator, Dict, Iterable, List, NamedTuple
 
-async def scrape_product(db: AsyncSession, product: Product) -> List[float] | None:
+logger = logging.getLogger(__name__)
+
+# identifies this process's leases on product_urls
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+class ScrapeJob(NamedTuple):
+    """One URL to scrape, detached from the ORM session."""
+    url_id: UUID
+    product_id: UUID
+    url: str
+    retailer: str | None
+    canonical_key: str | None
+
+def _retailer_key(job: ScrapeJob) -> str:
+    # group by the stored retailer name, falling back to the hostname
+    if job.retailer:
+        return job.retailer.strip().lower()
+    return (urlsplit(job.url).hostname or "").lower()
+
+class ScrapeOutcome(NamedTuple):
+    job: ScrapeJob
+    price: float | None
+    cache: ScrapeCacheUpsert | None # validators to store, if they changed
+    previous_price: float | None # last known price, for volatility
+
+class FetchedPage(NamedTuple):
+    job: ScrapeJob
+    cached: ScrapeCacheInDB | None
+    result: FetchResult | None
+    price: float | None # known without parsing (304 or unchanged body)
+    needs_parse: bool
+
+async def _fetch_one(job: ScrapeJob, cached: ScrapeCacheInDB | None) -> FetchedPage:
+    """Fetch one page, reusing the cached price when the page is known to be unchanged."""
+
+    # a 304 is only useful when there is a price to reuse
+    use_validators = (
+        settings.SCRAPER_CONDITIONAL_GET and cached is not None and cached.last_price is not None
+    )
+    result = await fetch_conditional(
+        job.url,
+        etag=cached.etag if use_validators else None,
+        last_modified=cached.last_modified if use_validators else None,
+        retailer=job.retailer
+    )
+    if result is None:
+        return FetchedPage(job, cached, None, None, False)
+
+    if result.not_modified and use_validators:
+        scrape_metrics.incr("cache_hits")
+        return FetchedPage(job, cached, result, cached.last_price, False)
+
+    scrape_metrics.incr("cache_misses")
+
+    # identical body to the last parse: carry the price over without parsing
+    unchanged = (
+        cached is not None
+        and cached.last_price is not None
+        and result.content_hash is not None
+        and cached.content_hash == result.content_hash
+    )
+    if unchanged:
+        scrape_metrics.incr("content_hash_hits")
+        return FetchedPage(job, cached, result, cached.last_price, False)
+    return FetchedPage(job, cached, result, None, bool(result.content))
+
+def _to_outcome(page: FetchedPage, price: float | None) -> ScrapeOutcome:
+    job, cached, result, _, _ = page
+    previous_price = cached.last_price if cached is not None else None
+    if result is None or result.not_modified:
+        return ScrapeOutcome(job, price, None, previous_price)
+
+    cache = ScrapeCacheUpsert(
+        product_url_id=job.url_id,
+        etag=result.etag,
+        last_modified=result.last_modified,
+        last_price=price,
+        content_hash=result.content_hash
+    )
+    if cached is not None and cache == ScrapeCacheUpsert(**cached.model_dump()):
+        cache = None # nothing new to store
+    return ScrapeOutcome(job, price, cache, previous_price)
+
+def _change_score(previous: float, price: float) -> float:
+    """0 for an unchanged price, 0.5..1 for a change, growing with its relative size."""
+    if abs(price - previous) < 0.005:
+        return 0.0
+    relative = abs(price - previous) / previous if previous else 1.0
+    return min(1.0, 0.5 + 0.5 * relative / settings.SCRAPE_VOLATILITY_MAGNITUDE)
+
+async def _fetch_and_extract(
+    db: AsyncSession,
+    jobs: List[ScrapeJob],
+    global_slots: asyncio.Semaphore,
+    retailer_slots: Dict[str, asyncio.Semaphore]
+) -> List[ScrapeOutcome]:
+    """
+    Fetch a batch of jobs concurrently, then parse the changed pages off the event loop.
+    URLs sharing a canonical key are fetched once and the result fans out to all of them.
+    """
+
+    cache = await crud.get_scrape_cache(db, [job.url_id for job in jobs])
+
+    groups: Dict[str, List[ScrapeJob]] = {}
+    for job in jobs:
+        groups.setdefault(job.canonical_key or canonical_url(job.url), []).append(job)
+    # fetch through a URL with a cached price where possible, so validators can be sent
+    leaders = [
+        max(group, key=lambda job: job.url_id in cache and cache[job.url_id].last_price is not None)
+        for group in groups.values()
+    ]
+    scrape_metrics.incr("shared_fetches", len(jobs) - len(leaders))
+
+    async def run(job: ScrapeJob) -> FetchedPage:
+        key = _retailer_key(job)
+        if key not in retailer_slots:
+            retailer_slots[key] = asyncio.Semaphore(settings.SCRAPER_PER_RETAILER_CONCURRENCY)
+
+        async with global_slots, retailer_slots[key]:
+            return await _fetch_one(job, cache.get(job.url_id))
+
+    pages = await asyncio.gather(*(run(job) for job in leaders))
+
+    to_parse = [page for page in pages if page.needs_parse]
+    scrape_metrics.incr("pages_parsed", len(to_parse))
+    parsed = await extract_prices([
+        PageToParse(page.result.content, page.job.retailer, page.job.url) for page in to_parse
+    ])
+    parsed_prices = {id(page): price for page, price in zip(to_parse, parsed)}
+
+    outcomes = []
+    for group, page in zip(groups.values(), pages):
+        price = parsed_prices.get(id(page), page.price)
+        for job in group:
+            outcomes.append(_to_outcome(page._replace(job=job, cached=cache.get(job.url_id)), price))
+    return outcomes
+
+class PriceWriteBuffer:
+    """
+    Collects scraped prices and writes them in batches of SCRAPER_WRITE_BATCH_SIZE:
+    one multi-row history INSERT, one bulk product UPDATE, one volatility UPDATE
+    and one commit per flush.
+    Only the caller's task touches it, so one session is safe.
+    """
+
+    def __init__(self, db: AsyncSession, batch_size: int | None = None):
+        self.db = db
+        self.batch_size = batch_size or settings.SCRAPER_WRITE_BATCH_SIZE
+        self.rows: List[PriceHistoryCreate] = []
+        self.cache_rows: Dict[UUID, ScrapeCacheUpsert] = {}
+        self.change_scores: Dict[UUID, float] = {}
+        self.flushes = 0
+
+    async def add(self, outcome: ScrapeOutcome):
+        job, price, cache, previous_price = outcome
+        if cache is not None:
+            self.cache_rows[job.url_id] = cache
+        if price is not None and previous_price is not None:
+            self.change_scores[job.url_id] = _change_score(previous_price, price)
+        if price is not None:
+            self.rows.append(PriceHistoryCreate(
+                product_id=job.product_id,
+                product_url_id=job.url_id,
+                recorded_at=datetime.now(timezone.utc),
+                price=price
+            ))
+        if len(self.rows) + len(self.cache_rows) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        if not self.rows and not self.cache_rows:
+            return
+        rows, self.rows = self.rows, []
+        cache_rows, self.cache_rows = list(self.cache_rows.values()), {}
+        change_scores, self.change_scores = self.change_scores, {}
+
+        await crud.bulk_upsert_scrape_cache(self.db, cache_rows)
+        await crud.update_url_volatility(self.db, change_scores)
+        if rows:
+            await crud.bulk_create_price_history(self.db, rows)
+        else:
+            await self.db.commit()
+        self.flushes += 1
+
+class ScrapeSummary(NamedTuple):
+    """What a scrape run did. `prices` is per product, for at most the first `keep_prices_for` products."""
+    urls_scraped: int
+    prices_found: int
+    prices: Dict[UUID, List[float]]
+    truncated: bool # some products' prices were not kept
+    missed: List[ScrapeJob] # jobs that produced no price, only collected with track_missed
+
+async def scrape_batches(
+    db: AsyncSession,
+    batches: AsyncIterator[List[ScrapeJob]],
+    keep_prices_for: int | None = None,
+    track_missed: bool = False
+) -> ScrapeSummary:
+    """
+    Scrape batches of URLs with bounded concurrency: at most SCRAPER_CONCURRENCY fetches
+    overall and SCRAPER_PER_RETAILER_CONCURRENCY per retailer. A batch takes roughly as
+    long as its slowest fetches instead of the sum of all of them, and only one batch
+    of jobs is held at a time. With `keep_prices_for` set, memory stays flat however
+    many URLs stream through: beyond that many products only the counts grow.
+    """
+
+    global_slots = asyncio.Semaphore(settings.SCRAPER_CONCURRENCY)
+    retailer_slots: Dict[str, asyncio.Semaphore] = {}
+    scraped_prices: Dict[UUID, List[float]] = {}
+    missed: List[ScrapeJob] = []
+    urls_scraped, prices_found, truncated = 0, 0, False
+    writer = PriceWriteBuffer(db)
+
+    async for batch in batches:
+        outcomes = await _fetch_and_extract(db, batch, global_slots, retailer_slots)
+        for outcome in outcomes:
+            await writer.add(outcome)
+            urls_scraped += 1
+            if outcome.price is None:
+                if track_missed:
+                    missed.append(outcome.job)
+                continue
+            prices_found += 1
+            product_id = outcome.job.product_id
+            if product_id in scraped_prices or keep_prices_for is None or len(scraped_prices) < keep_prices_for:
+                scraped_prices.setdefault(product_id, []).append(outcome.price)
+            else:
+                truncated = True
+
+    await writer.flush()
+    return ScrapeSummary(urls_scraped, prices_found, scraped_prices, truncated, missed)
+
+async def _in_batches(jobs: Iterable[ScrapeJob]) -> AsyncIterator[List[ScrapeJob]]:
+    jobs = list(jobs)
+    for start in range(0, len(jobs), settings.SCRAPER_BATCH_SIZE):
+        yield jobs[start:start + settings.SCRAPER_BATCH_SIZE]
+
+async def _paged_jobs(db: AsyncSession) -> AsyncIterator[List[ScrapeJob]]:
+    carry: List[ScrapeJob] = []
+    async for rows in crud.iter_product_url_pages(db, settings.SCRAPER_BATCH_SIZE):
+        jobs = carry + [ScrapeJob(*row) for row in rows]
+        # the last canonical page may continue on the next page of rows; keep it together
+        tail = jobs[-1].canonical_key
+        split = len(jobs)
+        while split > 0 and jobs[split - 1].canonical_key == tail:
+            split -= 1
+        if split == 0:
+            split = len(jobs) # one huge group, nothing to split on
+        batch, carry = jobs[:split], jobs[split:]
+        yield batch
+    if carry:
+        yield carry
+
+async def scrape_jobs(db: AsyncSession, jobs: Iterable[ScrapeJob]) -> Dict[UUID, List[float]]:
+    """Scrape an in-memory list of URLs, SCRAPER_BATCH_SIZE at a time. Returns prices per product."""
+    summary = await scrape_batches(db, _in_batches(jobs))
+    return summary.prices
+
+async def _heartbeat(owner: str, url_ids: List[UUID]):
+    # own session: the batch is still using the caller's session concurrently
+    while True:
+        await asyncio.sleep(settings.SCRAPE_HEARTBEAT_SECONDS)
+        try:
+            async with SessionLocal() as db:
+                held = await crud.extend_product_url_leases(db, owner, url_ids)
+        except (SQLAlchemyError, OSError) as exc:
+            # try again next beat; the lease outlives a few missed ones
+            scrape_metrics.incr("heartbeat_errors")
+            logger.warning("lease heartbeat for %d urls failed: %r", len(url_ids), exc)
+            continue
+        if held < len(url_ids):
+            scrape_metrics.incr("leases_lost", len(url_ids) - held)
+
+def _retry_delay(job: ScrapeJob) -> float:
+    # an open breaker knows when its host is worth trying again; otherwise retry soon
+    return get_breaker(job.url).retry_in() or settings.SCRAPE_MIN_INTERVAL
+
+async def scrape_due(db: AsyncSession, limit: int, owner: str = WORKER_ID) -> int:
+    """
+    Lease and scrape one batch of due URLs, heartbeating the leases while the batch
+    runs. Returns how many were claimed. URLs that produced a price get their full
+    check interval; failed or deferred ones are retried after a short delay. If the
+    batch fails the leases are left to expire, so another worker retries those URLs later.
+    """
+
+    rows = await crud.claim_due_product_urls(db, owner, limit)
+    if not rows:
+        return 0
+
+    url_ids = [row[0] for row in rows]
+    heartbeat = asyncio.create_task(_heartbeat(owner, url_ids))
+    try:
+        summary = await scrape_batches(db, _in_batches(ScrapeJob(*row) for row in rows), track_missed=True)
+    finally:
+        heartbeat.cancel()
+        (stopped,) = await asyncio.gather(heartbeat, return_exceptions=True)
+        if isinstance(stopped, Exception): # anything but the cancellation itself
+            logger.error("lease heartbeat for %d urls stopped early: %r", len(url_ids), stopped)
+    retry_after = {job.url_id: _retry_delay(job) for job in summary.missed}
+    await crud.release_product_urls(db, owner, url_ids, retry_after)
+    return len(rows)
+
+async def scrape_product(db: AsyncSession, product: Product | ProductInDB) -> List[float] | None:
     """Scrape the product's price from its URL and return the price."""
-    
-    returned_prices = []
-    
+
     # Fetch the product URLs
     results = await db.execute(
-        ProductURL.select().where(ProductURL.c.product_id == product.id)
+        select(*crud.SCRAPE_JOB_COLUMNS).where(ProductURL.product_id == product.id)
     )
-    product_url_records = await results.scalars().all()
-    
-    for record in product_url_records:
-        url = record.url
-        
-        html_content = await fetch_page(url)
-        if not html_content:
-            continue
-        
-        price = extract_price(html_content)
-        if price is None:
-            continue
-        
-        # upate product current price and last checked
-        product.current_price = price
-        product.last_checked = func.now()
-        
-        # create a new price history record
-        new_price_history = PriceHistory(
-            product_id=product.id,
-            product_url_id=record.id,
-            price=price
-        )
-        db.add(new_price_history)
-        await db.commit()
-        await db.refresh(product)
-        returned_prices.append(price)
-        
-    if returned_prices:
-        return returned_prices
-    return None
-
-async def scrape_all_products(db: AsyncSession) -> List[dict] | None:
-    """Scrape prices for all products in the database."""
-    
-    results = await db.execute(Product.select())
-    products = await results.scalars().all()
-    returned_data = []
-    
-    for product in products:
-        prices = await scrape_product(db, product)
-        if prices:
-            returned_data.append({
-                "product_id": product.id,
-                "name": product.name,
-                "scraped_prices": prices
-            })
-     
-    if returned_data:   
-        return returned_data
-    return None
-    
\ No newline at end of file
+    jobs = [ScrapeJob(*row) for row in results.all()]
+
+    scraped_prices = await scrape_jobs(db, jobs)
+    return scraped_prices.get(product.id) or None
+
+async def scrape_all_products(db: AsyncSession) -> dict | None:
+    """
+    Scrape prices for all products in the database. URLs are streamed in keyset-paged
+    batches of plain rows, so no ORM objects are loaded however many URLs there are,
+    and only the first SCRAPE_ALL_RESULTS_LIMIT products' prices are kept for the reply.
+    """
+
+    summary = await scrape_batches(db, _paged_jobs(db), settings.SCRAPE_ALL_RESULTS_LIMIT)
+    if not summary.prices_found:
+        return None
+
+    names = await crud.get_product_names(db, list(summary.prices))
+    return {
+        "urls_scraped": summary.urls_scraped,
+        "prices_found": summary.prices_found,
+        "results_truncated": summary.truncated,
+        "results": [
+            {"product_id": product_id, "name": names.get(product_id), "scraped_prices": prices}
+            for product_id, prices in summary.prices.items()
+        ],
+    }
@@ -1,45 +1,460 @@
+import asyncio
+import hashlib
 import httpx
+import json
+import random
 import re
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from importlib.util import find_spec
 from selectolax.parser import HTMLParser
+from app.services import scrape_metrics
+from app.services.circuit_breaker import get_breaker
+from app.services.latency import get_latency_tracker
+from app.services.rate_limit import get_host_limiter, parse_retry_after, reset_limiters
+from app.services.retailer_rules import RetailerRule, get_rule
+from app.utils.config.settings import settings
+
+try:
+    import xxhash
+except ImportError: # optional, falls back to hashlib
+    xxhash = None
+
+# Shared client, opened by the app lifespan (or a standalone scrape job) so that
+# every fetch reuses pooled keep-alive connections instead of a new TLS handshake.
+_client: httpx.AsyncClient | None = None
+
+THROTTLE_STATUSES = {429, 503}
+
+def _build_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=settings.SCRAPER_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.SCRAPER_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.SCRAPER_KEEPALIVE_EXPIRY,
+    )
+    return httpx.AsyncClient(
+        timeout=settings.SCRAPER_TIMEOUT,
+        limits=limits,
+        http2=settings.SCRAPER_HTTP2 and find_spec("h2") is not None,
+        follow_redirects=True,
+        headers={"User-Agent": settings.SCRAPER_USER_AGENT},
+    )
+
+async def open_http_client() -> httpx.AsyncClient:
+    """Create the shared scraper client if it isn't open yet."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+async def close_http_client():
+    """Close the shared scraper client and drop its pooled connections."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    reset_limiters()
+
+@asynccontextmanager
+async def http_client_session():
+    """
+    Use the shared client for the duration of the block.
+    Reuses the lifespan client when one is open, otherwise owns a temporary one.
+    """
+    owns_client = _client is None or _client.is_closed
+    client = await open_http_client()
+    try:
+        yield client
+    finally:
+        if owns_client:
+            await close_http_client()
+
+def hash_content(content: bytes) -> str:
+    """Fast non-cryptographic fingerprint of a page body."""
+    if xxhash is not None:
+        return xxhash.xxh3_128_hexdigest(content)
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+@dataclass
+class FetchResult:
+    status_code: int
+    content: bytes | None = None # raw body bytes, possibly cut short
+    etag: str | None = None
+    last_modified: str | None = None
+    content_hash: str | None = None
+    truncated: bool = False # stopped before the end of the body
+    
+    @property
+    def not_modified(self) -> bool:
+        return self.status_code == 304
+
+async def _read_body(response: httpx.Response, stop_marker: bytes | None) -> tuple[bytes, bool]:
+    """
+    Read the body in chunks, stopping at SCRAPER_MAX_BODY_BYTES or once the
+    retailer's stop marker has been seen. Returns (body, truncated).
+    """
+    limit = settings.SCRAPER_MAX_BODY_BYTES
+    body = bytearray()
+    async for chunk in response.aiter_bytes(settings.SCRAPER_STREAM_CHUNK_BYTES):
+        # the marker may straddle two chunks
+        search_from = max(0, len(body) - len(stop_marker)) if stop_marker else 0
+        body += chunk
+        if len(body) >= limit:
+            scrape_metrics.incr("bodies_capped")
+            return bytes(body[:limit]), True
+        if stop_marker and body.find(stop_marker, search_from) != -1:
+            scrape_metrics.incr("early_stops")
+            return bytes(body), True
+    return bytes(body), False
+
+#------ Fetch errors ------
+class FetchError(Exception):
+    """A page could not be fetched."""
+    transient = False
+    
+    def __init__(self, message: str, status_code: int | None = None, retry_after: float | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class TransientFetchError(FetchError):
+    """Timeouts, connection failures, 429 and 5xx: worth retrying."""
+    transient = True
+
+class PermanentFetchError(FetchError):
+    """404, 410 and other 4xx: the host answered, retrying won't help."""
+
+def _backoff_delay(attempt: int, retry_after: float | None) -> float:
+    if retry_after is not None:
+        return retry_after
+    # full jitter: uniform in [0, base * 2^attempt], capped
+    ceiling = min(settings.SCRAPER_RETRY_MAX_DELAY, settings.SCRAPER_RETRY_BASE_DELAY * 2 ** attempt)
+    return random.uniform(0, ceiling)
+
+async def _fetch_once(
+    url: str, headers: dict, stop_marker: bytes | None, etag: str | None, last_modified: str | None
+) -> FetchResult:
+    """One request under the host's rate limiter. Raises FetchError subclasses on failure."""
+    limiter = get_host_limiter(url)
+    tracker = get_latency_tracker(url)
+    # per-phase timeout derived from this host's latency; waiting for a pooled connection keeps the default
+    host_timeout = tracker.timeout()
+    timeout = httpx.Timeout(host_timeout, pool=settings.SCRAPER_TIMEOUT)
+    await limiter.acquire()
+    success, retry_after = None, None
+    started = time.monotonic()
+    try:
+        client = await open_http_client()
+        async with client.stream("GET", url, headers=headers, timeout=timeout) as response:
+            status = response.status_code
+            if status in THROTTLE_STATUSES:
+                scrape_metrics.incr("throttled")
+                success = False
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                raise TransientFetchError(f"HTTP {status}", status, retry_after)
+            if status >= 500:
+                raise TransientFetchError(f"HTTP {status}", status)
+            if status == 304:
+                success = True
+                tracker.record_revalidation(time.monotonic() - started)
+                # a 304 may omit validators that are still current
+                return FetchResult(
+                    status_code=304,
+                    etag=response.headers.get("ETag") or etag,
+                    last_modified=response.headers.get("Last-Modified") or last_modified,
+                )
+            if status != 200:
+                raise PermanentFetchError(f"HTTP {status}", status)
+            
+            # leaving the block early closes the connection instead of draining the rest
+            content, truncated = await _read_body(response, stop_marker)
+            success = True
+            tracker.record(time.monotonic() - started)
+            return FetchResult(
+                status_code=200,
+                content=content,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+                content_hash=hash_content(content),
+                truncated=truncated,
+            )
+    except httpx.TimeoutException as exc:
+        scrape_metrics.incr("timeouts")
+        success = False
+        if not isinstance(exc, httpx.PoolTimeout): # waiting for our own pool says nothing about the host
+            tracker.record_timeout(time.monotonic() - started, host_timeout)
+        raise TransientFetchError(f"timeout: {exc!r}") from exc
+    except httpx.TransportError as exc:
+        raise TransientFetchError(f"transport error: {exc!r}") from exc
+    except httpx.HTTPError as exc:
+        raise PermanentFetchError(f"request error: {exc!r}") from exc
+    finally:
+        limiter.release(success, retry_after)
+
+async def _hedged_fetch(
+    url: str, headers: dict, stop_marker: bytes | None, etag: str | None, last_modified: str | None
+) -> FetchResult:
+    """
+    Fetch once, and if the host's p95 latency passes without an answer, fire a
+    second identical request and take whichever succeeds first.
+    """
+    delay = get_latency_tracker(url).hedge_delay()
+    if delay is None:
+        return await _fetch_once(url, headers, stop_marker, etag, last_modified)
+    
+    first = asyncio.create_task(_fetch_once(url, headers, stop_marker, etag, last_modified))
+    tasks = [first]
+    error = None
+    try:
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+        
+        scrape_metrics.incr("hedges_fired")
+        second = asyncio.create_task(_fetch_once(url, headers, stop_marker, etag, last_modified))
+        tasks.append(second)
+        pending = {first, second}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        scrape_metrics.incr("hedges_won")
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        # the loser, or both if the caller was cancelled: release their connections
+        unfinished = [task for task in tasks if not task.done()]
+        for task in unfinished:
+            task.cancel()
+        await asyncio.gather(*unfinished, return_exceptions=True)
+
+async def fetch_conditional(
+    url: str,
+    etag: str | None = None,
+    last_modified: str | None = None,
+    retailer: str | None = None
+) -> FetchResult | None:
+    """
+    Stream a page as bytes, sending If-None-Match / If-Modified-Since when validators are known.
+    Transient failures are retried up to SCRAPER_MAX_RETRIES times with jittered backoff.
+    Returns None when the page can't be fetched or its host's circuit breaker is open.
+    """
+    breaker = get_breaker(url)
+    if not breaker.allow():
+        scrape_metrics.incr("deferred")
+        return None
+    
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+        
+    rule = get_rule(retailer, url)
+    stop_marker = rule.stop_marker if rule else None
+    
+    probe = breaker.state == breaker.HALF_OPEN
+    try:
+        for attempt in range(settings.SCRAPER_MAX_RETRIES + 1):
+            try:
+                result = await _hedged_fetch(url, headers, stop_marker, etag, last_modified)
+            except PermanentFetchError:
+                scrape_metrics.incr("permanent_errors")
+                breaker.record_success() # the host itself is up
+                return None
+            except TransientFetchError as exc:
+                delay = _backoff_delay(attempt, exc.retry_after)
+                if attempt == settings.SCRAPER_MAX_RETRIES or delay > settings.SCRAPER_RETRY_MAX_DELAY:
+                    scrape_metrics.incr("transient_errors")
+                    breaker.record_failure()
+                    return None
+                scrape_metrics.incr("retries")
+                await asyncio.sleep(delay)
+                continue
+            except Exception:
+                scrape_metrics.incr("unexpected_errors")
+                breaker.record_failure()
+                return None
+            
+            breaker.record_success()
+            return result
+        return None
+    finally:
+        # a probe that ended without an outcome (cancelled) must not leave the host deferred forever
+        if probe and breaker.state == breaker.HALF_OPEN:
+            breaker.abandon_probe()
 
 async def fetch_page(url: str) -> str | None:
     """Fetch the HTML content of a webpage asynchronously."""
-    try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            response = await client.get(url)
-            if response.status_code == 200:
-                return response.text
+    result = await fetch_conditional(url)
+    if not result or result.content is None:
+        return None
+    return result.content.decode("utf-8", errors="replace")
+
+PRICE_TEXT_REGEX = re.compile(r"[$€£₦]\s?\d(?:[\d.,]*\d)?")
+NON_PRICE_CHARS = re.compile(r"[^\d.,]")
+SEPARATOR = re.compile(r"[.,]")
+PRICE_CLASS_SELECTORS = tuple(
+    f".{cls}" for cls in ["price", "current-price", "product-price", "amount", "cost"]
+)
+
+#------ Structured data ------
+PRODUCT_TYPES = {"product", "offer", "aggregateoffer", "productgroup"}
+PRICE_META_SELECTORS = (
+    'meta[property="product:price:amount"]',
+    'meta[property="og:price:amount"]',
+    'meta[itemprop="price"]',
+)
+
+def _to_price(value) -> float | None:
+    """
+    Number from a price string, working out which separator is the decimal point:
+    "1,299.00", "1.299,00", "12,50" and "1,299" all parse; strings that mix the
+    separators inconsistently ("1,299,00", "1.234,567") return None.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if not isinstance(value, str):
+        return None
+    cleaned = NON_PRICE_CHARS.sub("", value).strip(".,")
+    groups = SEPARATOR.split(cleaned)
+    separators = SEPARATOR.findall(cleaned)
+    if not cleaned or not all(groups):
+        return None
+    if separators:
+        last, tail = separators[-1], groups[-1]
+        others = set(separators[:-1])
+        if last == "," and len(tail) <= 2 and others <= {"."}:
+            decimal = "," # 12,50 / 1.299,00
+        elif last == "." and len(separators) > 1 and others == {"."}:
+            decimal = None # 1.299.000: thousands dots only
+        elif last == "." and others <= {","}:
+            decimal = "." # 12.50 / 1,299.00
+        elif last == "," and len(tail) == 3 and others <= {","}:
+            decimal = None # 1,299 / 1,299,000
+        else:
+            return None
+        thousands = groups[1:] if decimal is None else groups[1:-1]
+        if any(len(group) != 3 for group in thousands):
             return None
-    except Exception:
+        integer = "".join(groups[:-1] if decimal else groups)
+        cleaned = f"{integer}.{tail}" if decimal else integer
+    try:
+        return float(cleaned)
+    except ValueError:
+        return None
+
+def _ld_types(node: dict) -> set[str]:
+    types = node.get("@type", [])
+    if isinstance(types, str):
+        types = [types]
+    return {t.lower() for t in types if isinstance(t, str)}
+
+def _price_from_ld_node(node) -> float | None:
+    """Walk a JSON-LD value depth-first for the first Product/Offer price."""
+    if isinstance(node, list):
+        for item in node:
+            price = _price_from_ld_node(item)
+            if price is not None:
+                return price
+        return None
+    if not isinstance(node, dict):
         return None
     
-def extract_price(html: str) -> float | None:
+    if _ld_types(node) & PRODUCT_TYPES:
+        for key in ("price", "lowPrice"):
+            price = _to_price(node.get(key))
+            if price is not None:
+                return price
+        spec = node.get("priceSpecification")
+        if isinstance(spec, dict):
+            price = _to_price(spec.get("price"))
+            if price is not None:
+                return price
+            
+    for key in ("offers", "@graph", "hasVariant", "mainEntity"):
+        if key in node:
+            price = _price_from_ld_node(node[key])
+            if price is not None:
+                return price
+    return None
+
+def _price_from_json_ld(tree: HTMLParser) -> float | None:
+    for node in tree.css('script[type="application/ld+json"]'):
+        try:
+            data = json.loads(node.text(deep=True, strip=True))
+        except ValueError:
+            continue
+        price = _price_from_ld_node(data)
+        if price is not None:
+            return price
+    return None
+
+def _price_from_markup(tree: HTMLParser) -> float | None:
+    # og / product meta tags, then schema.org microdata
+    for selector in PRICE_META_SELECTORS:
+        node = tree.css_first(selector)
+        if node:
+            price = _to_price(node.attributes.get("content"))
+            if price is not None:
+                return price
+            
+    node = tree.css_first('[itemprop="price"]')
+    if node:
+        return _to_price(node.attributes.get("content") or node.text(strip=True))
+    return None
+
+def extract_structured_price(tree: HTMLParser) -> float | None:
+    """Price from JSON-LD, meta tags or microdata, looking at a handful of nodes only."""
+    price = _price_from_json_ld(tree)
+    if price is None:
+        price = _price_from_markup(tree)
+    return price
+
+def extract_rule_price(tree: HTMLParser, rule: RetailerRule) -> float | None:
+    """Targeted lookup with the retailer's own selectors."""
+    for selector in rule.selectors:
+        node = tree.css_first(selector)
+        if node is None:
+            continue
+        value = node.attributes.get(rule.attribute) if rule.attribute else None
+        price = rule.parse_amount(value or node.text(strip=True))
+        if price is not None:
+            return price
+    return None
+
+def extract_price(html: str | bytes, retailer: str | None = None, url: str | None = None) -> float | None:
     """Extract the price from the HTML content using Selectolax."""
     
     tree = HTMLParser(html=html)
     
-    # Scan for common price patterns
-    price_regex = re.compile(r"[$€£₦]\s?[\d,]+(?:\.\d+)?")
-    match = price_regex.search(tree.text())
+    # Known retailer: one selector lookup
+    rule = get_rule(retailer, url)
+    if rule is not None:
+        price = extract_rule_price(tree, rule)
+        if price is not None:
+            return price
+    
+    # Fast path: structured data published by the retailer
+    price = extract_structured_price(tree)
+    if price is not None:
+        return price
+    
+    # Fallback: scan the page text for common price patterns
+    match = PRICE_TEXT_REGEX.search(tree.text())
     
     if match:
-        price_str = match.group(0)
-        # Clean and convert to float
-        price_cleaned = re.sub(r"[^\d.]", "", price_str)
-        try:
-            return float(price_cleaned)
-        except ValueError:
-            return None
+        return _to_price(match.group(0))
         
     # try DOM-based extraction if regex fails
-    for cls in ["price", "current-price", "product-price", "amount", "cost"]:
-        node = tree.css_first(f".{cls}")
+    for selector in PRICE_CLASS_SELECTORS:
+        node = tree.css_first(selector)
         if node:
-            price_text = node.text()
-            price_cleaned = re.sub(r"[^\d.]", "", price_text)
-            try:
-                return float(price_cleaned)
-            except ValueError:
-                pass
+            price = _to_price(node.text())
+            if price is not None:
+                return price
             
     return None
\ No newline at end of file
@@ -0,0 +1,157 @@
+"""
+Bring an existing database up to the current models.
+
+Startup's create_all only creates missing tables; it never adds columns to tables
+that already exist. This adds the scheduling, lease, canonical-URL and price-run
+columns introduced since, (re)computes product_urls.canonical_key from each URL
+and then makes it NOT NULL. Safe to run more than once: run it before starting the
+new version, and again after canonical_url or a retailer rule's drop_params change.
+
+    python -m app.upgrade_schema
+
+price_history itself stays a plain table unless --partition-price-history is given:
+then it is converted to the monthly partitions app/services/partitions.py maintains.
+That copies every row while writes to price_history wait, so stop the scrapers and
+take a backup first. The old table is kept as price_history_unpartitioned; drop it
+once the copy is checked.
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timezone
+from sqlalchemy import String, column, text, update, values
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.future import select
+from app.database import Base, SessionLocal, engine
+from app.models import PriceHistory, ProductURL
+from app.services import partitions
+from app.utils.config.settings import settings
+from app.utils.urls import canonical_url
+
+ADD_COLUMNS = (
+    "ALTER TABLE products ADD COLUMN IF NOT EXISTS check_interval INTEGER",
+    # existing URLs all become due at once; the queue drains them in batches
+    "ALTER TABLE product_urls ADD COLUMN IF NOT EXISTS next_check_at TIMESTAMPTZ NOT NULL DEFAULT now()",
+    "ALTER TABLE product_urls ADD COLUMN IF NOT EXISTS check_interval INTEGER",
+    "ALTER TABLE product_urls ADD COLUMN IF NOT EXISTS volatility DOUBLE PRECISION",
+    "ALTER TABLE product_urls ADD COLUMN IF NOT EXISTS lease_owner VARCHAR(100)",
+    "ALTER TABLE product_urls ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMPTZ",
+    "ALTER TABLE product_urls ADD COLUMN IF NOT EXISTS canonical_key VARCHAR", # NOT NULL after the backfill
+    "ALTER TABLE price_history ADD COLUMN IF NOT EXISTS last_seen_at TIMESTAMPTZ",
+    "CREATE INDEX IF NOT EXISTS ix_product_urls_next_check_at ON product_urls (next_check_at)",
+)
+FINISH = (
+    "ALTER TABLE product_urls ALTER COLUMN canonical_key SET NOT NULL",
+    "CREATE INDEX IF NOT EXISTS ix_product_urls_canonical_key_id ON product_urls (canonical_key, id)",
+)
+
+async def backfill_canonical_keys(page_size: int = 1000) -> int:
+    """Set every URL's canonical_key to canonical_url(url) where it differs. Returns rows updated."""
+    updated = 0
+    last = None
+    async with SessionLocal() as db:
+        while True:
+            stmt = select(ProductURL.id, ProductURL.url, ProductURL.canonical_key).order_by(ProductURL.id)
+            if last is not None:
+                stmt = stmt.where(ProductURL.id > last)
+            rows = (await db.execute(stmt.limit(page_size))).all()
+            if not rows:
+                return updated
+            last = rows[-1].id
+
+            changed = [
+                (row.id, key) for row in rows
+                if (key := canonical_url(row.url)) != row.canonical_key
+            ]
+            if changed:
+                keys = values(
+                    column("id", PG_UUID(as_uuid=True)), column("key", String), name="keys"
+                ).data(changed)
+                await db.execute(
+                    update(ProductURL)
+                    .where(ProductURL.id == keys.c.id)
+                    .values(canonical_key=keys.c.key)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+                updated += len(changed)
+
+async def partition_price_history(conn: AsyncConnection) -> int | None:
+    """
+    Convert a plain price_history into a partitioned one, in the caller's transaction:
+    rename the old table and its indexes out of the way, create the partitioned table
+    with the model's indexes, one partition per month from the oldest row up to
+    PRICE_HISTORY_PARTITIONS_AHEAD months out plus the default, and copy the rows in.
+    Returns the rows copied, or None if price_history is already partitioned.
+    """
+    parent, old = partitions.PARENT, f"{partitions.PARENT}_unpartitioned"
+    await conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": partitions.MAINTENANCE_LOCK_ID})
+    relkind = await conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"), {"name": parent}
+    )
+    if relkind.scalar() == "p":
+        return None
+
+    # readers carry on against the old table until the swap commits; writers wait
+    await conn.execute(text(f"LOCK TABLE {parent} IN EXCLUSIVE MODE"))
+    await conn.execute(text(f"ALTER TABLE {parent} RENAME TO {old}"))
+    indexes = await conn.execute(
+        text("SELECT indexname FROM pg_indexes WHERE tablename = :name"), {"name": old}
+    )
+    for name in indexes.scalars().all(): # the new table's indexes reuse these names
+        await conn.execute(text(f'ALTER INDEX "{name}" RENAME TO "{name[:50]}_unpartitioned"'))
+    await conn.run_sync(PriceHistory.__table__.create)
+
+    oldest = (await conn.execute(text(f"SELECT min(recorded_at) FROM {old}"))).scalar()
+    this_month = partitions.month_start(datetime.now(timezone.utc))
+    month = partitions.month_start(oldest) if oldest is not None and oldest < this_month else this_month
+    last = partitions.add_months(this_month, settings.PRICE_HISTORY_PARTITIONS_AHEAD)
+    while month <= last:
+        following = partitions.add_months(month, 1)
+        await conn.execute(text(
+            f"CREATE TABLE {partitions.partition_name(month)} PARTITION OF {parent} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+        ))
+        month = following
+    await conn.execute(text(f"CREATE TABLE {partitions.DEFAULT} PARTITION OF {parent} DEFAULT"))
+
+    columns = partitions.COLUMNS
+    copied = await conn.execute(text(f"INSERT INTO {parent} ({columns}) SELECT {columns} FROM {old}"))
+    return copied.rowcount
+
+async def upgrade(partition: bool = False):
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all) # tables that don't exist yet
+            for statement in ADD_COLUMNS:
+                await conn.execute(text(statement))
+        print(f"canonical_key: {await backfill_canonical_keys()} urls updated")
+        async with engine.begin() as conn:
+            for statement in FINISH:
+                await conn.execute(text(statement))
+        if partition:
+            async with engine.begin() as conn:
+                copied = await partition_price_history(conn)
+            if copied is None:
+                print("price_history is already partitioned")
+            else:
+                print(f"price_history: {copied} rows copied into monthly partitions, old table kept")
+        print("schema is up to date")
+    finally:
+        await engine.dispose()
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--partition-price-history", action="store_true",
+        help="convert a plain price_history to monthly partitions (copies every row)"
+    )
+    args = parser.parse_args(argv)
+
+    engine.echo = False
+    asyncio.run(upgrade(partition=args.partition_price_history))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,5 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
+from typing import Literal
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(
@@ -16,5 +17,84 @@ class Settings(BaseSettings):
     SMTP_USER: str
     SMTP_PASS: str
     
+    # Scraper HTTP client
+    SCRAPER_TIMEOUT: float = 10.0 # until a host has latency history
+    SCRAPER_MAX_CONNECTIONS: int = 100 # total pool size
+    SCRAPER_MAX_CONNECTIONS_PER_HOST: int = 10 # ceiling for the adaptive per-host limit
+    SCRAPER_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    SCRAPER_KEEPALIVE_EXPIRY: float = 30.0
+    SCRAPER_HTTP2: bool = False # needs the optional `h2` package
+    SCRAPER_MAX_BODY_BYTES: int = 3_000_000 # stop reading a page past this size
+    SCRAPER_STREAM_CHUNK_BYTES: int = 65_536
+    SCRAPER_USER_AGENT: str = "Mozilla/5.0 (compatible; PriceWatchr/0.1)"
+    
+    # Per-host rate limiting (token bucket + AIMD concurrency)
+    SCRAPER_HOST_RATE: float = 5.0 # requests per second per host
+    SCRAPER_HOST_BURST: int = 10
+    SCRAPER_HOST_INITIAL_CONCURRENCY: float = 2.0
+    SCRAPER_AIMD_INCREASE: float = 1.0 # ~ +1 slot per limit's worth of successes
+    SCRAPER_AIMD_DECREASE: float = 0.5 # factor applied on 429/503/timeouts
+    SCRAPER_MAX_RETRY_AFTER: float = 300.0 # cap on how long Retry-After may pause a host
+    
+    # Latency-derived timeouts and hedging
+    SCRAPER_LATENCY_WINDOW: int = 200 # recent requests kept per host
+    SCRAPER_LATENCY_MIN_SAMPLES: int = 20 # use SCRAPER_TIMEOUT until a host has this many
+    SCRAPER_TIMEOUT_MULTIPLIER: float = 3.0 # timeout = p99 x this
+    SCRAPER_MIN_TIMEOUT: float = 2.0
+    SCRAPER_MAX_TIMEOUT: float = 30.0
+    SCRAPER_HEDGE_REQUESTS: bool = False # second request after the host's p95
+    
+    # Retries and circuit breaking
+    SCRAPER_MAX_RETRIES: int = 2 # extra attempts for timeouts, 429 and 5xx
+    SCRAPER_RETRY_BASE_DELAY: float = 0.5
+    SCRAPER_RETRY_MAX_DELAY: float = 10.0 # longer Retry-After values skip the URL this run
+    SCRAPER_BREAKER_THRESHOLD: int = 5 # consecutive failures before a host is skipped
+    SCRAPER_BREAKER_COOLDOWN: float = 600.0
+    SCRAPER_BREAKER_MAX_COOLDOWN: float = 6 * 3600.0
+    
+    # Scrape engine
+    SCRAPER_CONCURRENCY: int = 50 # in-flight fetches across all retailers
+    SCRAPER_PER_RETAILER_CONCURRENCY: int = 4
+    SCRAPER_BATCH_SIZE: int = 500 # urls fetched concurrently per wave
+    SCRAPER_WRITE_BATCH_SIZE: int = 1000 # price rows per INSERT/commit
+    SCRAPER_CONDITIONAL_GET: bool = True # send ETag / Last-Modified validators
+    SCRAPE_ALL_RESULTS_LIMIT: int = 100 # products listed in a scrape-all reply; the rest are only counted
+    
+    # HTML parsing
+    SCRAPER_PARSE_EXECUTOR: Literal["process", "thread", "inline"] = "process"
+    SCRAPER_PARSE_WORKERS: int = 0 # per scrape worker process; 0 = one per CPU core
+    SCRAPER_API_PARSE_WORKERS: int = 2 # per API process (each uvicorn worker), started only if it scrapes
+    SCRAPER_PARSE_BATCH_SIZE: int = 16 # pages per executor task
+    SCRAPER_RULES_PATH: str = "" # defaults to app/data/retailer_rules.json
+    SCRAPER_RULES_RELOAD_SECONDS: float = 30.0
+    
+    # Price history
+    PRICE_HISTORY_MODE: Literal["on_change", "every_scrape"] = "on_change" # on_change extends last_seen_at
+    PRICE_ROLLUPS_ENABLED: bool = True # maintain hourly/daily rollups as prices are written
+    PRICE_HISTORY_PARTITIONS_AHEAD: int = 3 # monthly partitions created in advance
+    PRICE_HISTORY_RETENTION_DAYS: int = 0 # drop raw months and hourly rollups older than this (daily rollups stay); 0 = keep
+    
+    # Due-queue scheduling
+    SCRAPE_DEFAULT_INTERVAL: int = 3600 # seconds, until a URL has a volatility-based interval
+    SCRAPE_INTERVAL_JITTER: float = 0.1 # +/- share of the interval, spreads load over time
+    SCHEDULER_POLL_SECONDS: int = 5
+    SCHEDULER_DUE_BATCH_SIZE: int = 200
+    SCHEDULER_MAX_BATCHES_PER_TICK: int = 10
+    SCHEDULER_RUN_SCRAPES: bool = True # False when dedicated scrape workers do the work
+    SCRAPE_LEASE_SECONDS: int = 300 # a crashed worker's URLs become claimable again after this
+    SCRAPE_HEARTBEAT_SECONDS: int = 60
+    
+    # Scheduler leader election (one process runs scheduled jobs)
+    SCHEDULER_LEADER_ELECTION: bool = True
+    SCHEDULER_LEADER_LOCK_ID: int = 7_140_001 # pg advisory lock key, shared by all processes
+    SCHEDULER_LEADER_CHECK_SECONDS: int = 10 # failover takes up to this long
+    
+    # Volatility-adaptive intervals (a product's own check_interval overrides these)
+    SCRAPE_MIN_INTERVAL: int = 900 # most volatile URLs
+    SCRAPE_MAX_INTERVAL: int = 86400 # URLs that never change
+    SCRAPE_VOLATILITY_ALPHA: float = 0.2 # EWMA weight of the newest observation
+    SCRAPE_VOLATILITY_MAGNITUDE: float = 0.1 # relative move that counts as a full-strength change
+    SCRAPE_INITIAL_VOLATILITY: float = 0.5
+    
 # Create a singleton instance
-settings = Settings()
\ No newline at end of file
+settings = Settings()
@@ -0,0 +1,18 @@
+import base64
+import json
+from datetime import datetime
+from uuid import UUID
+
+def encode_cursor(recorded_at: datetime, row_id: UUID) -> str:
+    """Opaque keyset cursor: the sort key of the last row returned."""
+    raw = json.dumps([recorded_at.isoformat(), str(row_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    """Inverse of encode_cursor. Raises ValueError for anything it didn't produce."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        recorded_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(recorded_at), UUID(row_id)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("invalid cursor") from exc
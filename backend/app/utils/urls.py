@@ -0,0 +1,60 @@
+import re
+from urllib.parse import parse_qsl, quote, urlencode, urlsplit, urlunsplit
+from app.services.retailer_rules import RetailerRule, get_rule
+
+# query parameters that only identify the visit, never the page, on any site;
+# site-specific ones (e.g. Amazon's "tag" and "ref") live in the retailer rules
+TRACKING_PARAMS = {
+    "gclid", "gclsrc", "dclid", "fbclid", "msclkid", "yclid", "igshid", "twclid", "ttclid",
+    "mc_cid", "mc_eid", "_ga", "_gl", "mkt_tok",
+}
+TRACKING_PREFIXES = ("utm_", "hsa_")
+DEFAULT_PORTS = {"http": 80, "https": 443}
+MULTIPLE_SLASHES = re.compile(r"/{2,}")
+PERCENT_ESCAPE = re.compile(r"%([0-9A-Fa-f]{2})")
+STRAY_PERCENT = re.compile(r"%(?![0-9A-Fa-f]{2})")
+UNRESERVED = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+
+def _is_tracking(name: str, rule: RetailerRule | None) -> bool:
+    lowered = name.lower()
+    if lowered in TRACKING_PARAMS or lowered.startswith(TRACKING_PREFIXES):
+        return True
+    return rule is not None and rule.drops_param(lowered)
+
+def _normalize_escapes(path: str) -> str:
+    # RFC 3986 6.2.2: decode only unreserved characters and uppercase the other
+    # escapes; %2F is not "/" and %3F is not "?", so those stay encoded
+    path = quote(STRAY_PERCENT.sub("%25", path), safe="/%:@!$&'()*+,;=-._~")
+    def normalize(match: re.Match) -> str:
+        char = chr(int(match[1], 16))
+        return char if char in UNRESERVED else f"%{match[1].upper()}"
+    return PERCENT_ESCAPE.sub(normalize, path)
+
+def canonical_url(url: str) -> str:
+    """
+    Dedup key for a product page: https, lowercase host without "www." or a default
+    port, path without duplicate or trailing slashes (case kept: product IDs and slugs
+    are often case-sensitive) and with normalized percent-escapes, tracking parameters
+    (generic ones plus the host's retailer rule `drop_params`) dropped, remaining
+    parameters sorted, no fragment.
+    Only used to recognise the same page; the stored URL is still what gets fetched.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").rstrip(".")
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+
+    path = MULTIPLE_SLASHES.sub("/", _normalize_escapes(parts.path))
+    path = path.rstrip("/") or "/"
+
+    rule = get_rule(url=f"{scheme}://{host}/")
+    query = sorted(
+        (name, value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not _is_tracking(name, rule)
+    )
+    # http and https serve the same product page; key both as https
+    return urlunsplit(("https" if scheme in DEFAULT_PORTS else scheme, host, path, urlencode(query), ""))
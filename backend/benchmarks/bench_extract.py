@@ -0,0 +1,139 @@
+"""
+Offline benchmark for app.services.scraper.extract_price.
+
+Runs every page in benchmarks/corpus (expected prices in corpus/expected.json)
+and reports throughput, per-page latency, peak memory and accuracy.
+
+    python -m benchmarks.bench_extract                  # run and compare with the baseline
+    python -m benchmarks.bench_extract --save-baseline  # record new baseline numbers
+    python -m benchmarks.bench_extract --json           # machine-readable output
+"""
+import argparse
+import json
+import math
+import os
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+# Settings() needs these even though nothing here touches the DB or SMTP
+for name, value in {
+    "DATABASE_URL": "postgresql+asyncpg://bench@localhost/bench",
+    "AUTH_SECRET_KEY": "bench",
+    "EMAIL_FROM": "bench@example.com",
+    "SMTP_SERVER": "localhost",
+    "SMTP_PORT": "25",
+    "SMTP_USER": "bench",
+    "SMTP_PASS": "bench",
+}.items():
+    os.environ.setdefault(name, value)
+
+from app.services.scraper import extract_price  # noqa: E402
+
+BENCH_DIR = Path(__file__).resolve().parent
+CORPUS_DIR = BENCH_DIR / "corpus"
+BASELINE_PATH = BENCH_DIR / "baseline_extract.json"
+
+def load_corpus(corpus_dir: Path = CORPUS_DIR) -> list[dict]:
+    with open(corpus_dir / "expected.json", encoding="utf8") as fh:
+        pages = json.load(fh)["pages"]
+    for page in pages:
+        page["html"] = (corpus_dir / page["file"]).read_bytes()
+    return pages
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+def run(pages: list[dict], repeat: int) -> dict:
+    # warm-up: imports, rule registry load, selector caches
+    for page in pages:
+        extract_price(page["html"], page.get("retailer"), page.get("url"))
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            t0 = time.perf_counter()
+            extract_price(page["html"], page.get("retailer"), page.get("url"))
+            latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+
+    # separate pass so tracing overhead doesn't skew the timings
+    failures = []
+    tracemalloc.start()
+    for page in pages:
+        price = extract_price(page["html"], page.get("retailer"), page.get("url"))
+        if price is None or not math.isclose(price, page["price"], rel_tol=1e-9):
+            failures.append({"file": page["file"], "expected": page["price"], "got": price})
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # lexbor allocates outside the Python heap, so report the process high-water mark too
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return {
+        "pages": len(pages),
+        "repeat": repeat,
+        "pages_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "peak_memory_kb": round(peak / 1024, 1),
+        "peak_rss_kb": peak_rss if sys.platform != "darwin" else peak_rss // 1024,
+        "accuracy": round((len(pages) - len(failures)) / len(pages), 4),
+        "failures": failures,
+    }
+
+def print_report(result: dict, baseline: dict | None):
+    rows = [
+        ("pages/second", "pages_per_second", True),
+        ("p50 latency (ms)", "p50_ms", False),
+        ("p99 latency (ms)", "p99_ms", False),
+        ("mean latency (ms)", "mean_ms", False),
+        ("peak py heap (KiB)", "peak_memory_kb", False),
+        ("peak RSS (KiB)", "peak_rss_kb", False),
+        ("accuracy", "accuracy", True),
+    ]
+    print(f"extract_price: {result['pages']} pages x {result['repeat']} runs")
+    for label, key, higher_is_better in rows:
+        line = f"  {label:<20} {result[key]:>12}"
+        if baseline and key in baseline and baseline[key]:
+            change = (result[key] - baseline[key]) / baseline[key] * 100
+            better = change >= 0 if higher_is_better else change <= 0
+            line += f"   baseline {baseline[key]:>10}  ({change:+.1f}% {'better' if better else 'worse'})"
+        print(line)
+
+    for failure in result["failures"]:
+        print(f"  MISS {failure['file']}: expected {failure['expected']}, got {failure['got']}")
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=50, help="passes over the corpus (default: 50)")
+    parser.add_argument("--corpus", type=Path, default=CORPUS_DIR)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    result = run(load_corpus(args.corpus), args.repeat)
+
+    baseline = None
+    if args.baseline.exists() and not args.save_baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf8"))
+
+    if args.json:
+        print(json.dumps({"result": result, "baseline": baseline}, indent=2))
+    else:
+        print_report(result, baseline)
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(result, indent=2) + "\n", encoding="utf8")
+        print(f"baseline written to {args.baseline}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,318 @@
+"""
+End-to-end scrape benchmark against a local mock retailer farm.
+
+Starts one HTTP server per simulated retailer (on 127.0.0.x loopback addresses where the
+OS allows it, otherwise separate ports on 127.0.0.1), seeds the database from DATABASE_URL
+with a throwaway user, N products and their URLs, then drives scrape_all_products end to end.
+No external network is used. Seeded rows are deleted afterwards unless --keep is given.
+
+    python -m benchmarks.bench_scrape --products 2000 --retailers 8 --latency-ms 80 --runs 2
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+from uuid import uuid4
+
+from sqlalchemy import delete, event, insert
+
+from app.database import Base, SessionLocal, engine
+from app.models import Product, ProductURL, User
+from app.services.extraction_pool import close_extraction_pool, open_extraction_pool
+from app.services import scrape_metrics
+from app.services.partitions import ensure_price_history_partitions
+from app.services.scrape_service import scrape_all_products
+from app.services.scraper import close_http_client, open_http_client
+
+#------ Mock retailer farm ------
+@dataclass
+class RetailerProfile:
+    name: str
+    latency_ms: float
+    error_rate: float
+    page_kb: int
+    supports_304: bool
+    change_rate: float # share of pages whose price changes between runs
+
+@dataclass
+class FarmStats:
+    requests: int = 0
+    not_modified: int = 0
+    errors: int = 0
+    bytes_sent: int = 0
+
+@dataclass
+class MockRetailer:
+    profile: RetailerProfile
+    stats: FarmStats
+    generation: int = 0 # bumped between runs so some prices move
+    padding: bytes = field(default=b"", repr=False)
+    host: str = "127.0.0.1"
+    port: int = 0
+
+    def price_for(self, path: str) -> float:
+        seed = int(hashlib.md5(path.encode()).hexdigest()[:8], 16)
+        changes = (seed % 1000) / 1000 < self.profile.change_rate
+        return round(10 + seed % 50000 / 100 + (self.generation if changes else 0), 2)
+
+    def render(self, path: str) -> tuple[bytes, str]:
+        price = self.price_for(path)
+        body = (
+            "<!DOCTYPE html><html><head><title>Product</title>"
+            '<script type="application/ld+json">'
+            + json.dumps({"@context": "https://schema.org", "@type": "Product",
+                          "offers": {"@type": "Offer", "price": f"{price:.2f}", "priceCurrency": "USD"}})
+            + "</script></head><body>"
+            "<div class=\"promo\">Free shipping over $35</div>"
+            f"<h1>{path}</h1><span class=\"price\">${price:,.2f}</span>"
+        ).encode() + self.padding + b"</body></html>"
+        return body, '"%s"' % hashlib.md5(body).hexdigest()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+
+                self.stats.requests += 1
+                path = request_line.split()[1].decode()
+                jitter = random.uniform(0.5, 1.5)
+                await asyncio.sleep(self.profile.latency_ms * jitter / 1000)
+
+                if random.random() < self.profile.error_rate:
+                    self.stats.errors += 1
+                    status, extra, body = "503 Service Unavailable", "", b"busy"
+                else:
+                    body, etag = self.render(path)
+                    if self.profile.supports_304 and headers.get("if-none-match") == etag:
+                        self.stats.not_modified += 1
+                        status, extra, body = "304 Not Modified", f"ETag: {etag}\r\n", b""
+                    else:
+                        status = "200 OK"
+                        extra = f"ETag: {etag}\r\n" if self.profile.supports_304 else ""
+
+                head = (
+                    f"HTTP/1.1 {status}\r\nContent-Type: text/html; charset=utf-8\r\n"
+                    f"Content-Length: {len(body)}\r\n{extra}Connection: keep-alive\r\n\r\n"
+                )
+                writer.write(head.encode() + body)
+                self.stats.bytes_sent += len(body)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+async def start_farm(profiles: list[RetailerProfile], stats: FarmStats) -> tuple[list[MockRetailer], list]:
+    retailers, servers = [], []
+    for i, profile in enumerate(profiles):
+        retailer = MockRetailer(profile, stats, padding=b"<!--" + b"x" * (profile.page_kb * 1024) + b"-->")
+        try:
+            # a distinct loopback address per retailer keeps per-host limits realistic (Linux)
+            server = await asyncio.start_server(retailer.handle, f"127.0.0.{i + 2}", 0)
+        except OSError:
+            server = await asyncio.start_server(retailer.handle, "127.0.0.1", 0)
+        retailer.host, retailer.port = server.sockets[0].getsockname()[:2]
+        retailers.append(retailer)
+        servers.append(server)
+    return retailers, servers
+
+#------ Database seeding ------
+async def seed(retailers: list[MockRetailer], products: int, urls_per_product: int, chunk: int = 1000):
+    user_id = uuid4()
+    product_rows, url_rows = [], []
+    for n in range(products):
+        product_id = uuid4()
+        product_rows.append({"id": product_id, "user_id": user_id, "name": f"bench-product-{n}"})
+        for u in range(urls_per_product):
+            retailer = retailers[(n + u) % len(retailers)]
+            url_rows.append({
+                "id": uuid4(),
+                "product_id": product_id,
+                "url": f"http://{retailer.host}:{retailer.port}/p/{n}/{u}?bench={user_id.hex[:8]}",
+                "is_primary": u == 0,
+                "retailer": retailer.profile.name,
+            })
+
+    async with SessionLocal() as db:
+        await db.execute(insert(User).values(
+            id=user_id, email=f"bench-{user_id.hex[:12]}@example.com", name="bench",
+            hashed_password="!", email_verified=True
+        ))
+        for start in range(0, len(product_rows), chunk):
+            await db.execute(insert(Product), product_rows[start:start + chunk])
+        for start in range(0, len(url_rows), chunk):
+            await db.execute(insert(ProductURL), url_rows[start:start + chunk])
+        await db.commit()
+    return user_id, len(url_rows)
+
+async def cleanup(user_id):
+    async with SessionLocal() as db:
+        await db.execute(delete(User).where(User.id == user_id)) # cascades to products and history
+        await db.commit()
+
+#------ Measurement ------
+class LoopLagMonitor:
+    """Measures how late a periodic timer fires: a proxy for event-loop blocking."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: list[float] = []
+        self._task: asyncio.Task | None = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def summary(self) -> dict:
+        if not self.samples:
+            return {"p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+        ordered = sorted(self.samples)
+        return {
+            "p50_ms": round(statistics.median(ordered) * 1000, 2),
+            "p99_ms": round(ordered[int(0.99 * (len(ordered) - 1))] * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2),
+        }
+
+async def bench(args) -> dict:
+    engine.echo = False
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with SessionLocal() as db:
+        await ensure_price_history_partitions(db)
+
+    commits = 0
+    def on_commit(_conn):
+        nonlocal commits
+        commits += 1
+    event.listen(engine.sync_engine, "commit", on_commit)
+
+    random.seed(args.seed)
+    profiles = [
+        RetailerProfile(
+            name=f"mock-retailer-{i}",
+            latency_ms=args.latency_ms * (args.slow_factor if i == 0 else 1),
+            error_rate=args.error_rate,
+            page_kb=args.page_kb,
+            supports_304=i < round(args.retailers * args.etag_share),
+            change_rate=args.change_rate,
+        )
+        for i in range(args.retailers)
+    ]
+    farm_stats = FarmStats()
+    retailers, servers = await start_farm(profiles, farm_stats)
+    user_id, url_count = await seed(retailers, args.products, args.urls_per_product)
+
+    await open_http_client()
+    open_extraction_pool(dedicated=True)
+    runs = []
+    try:
+        for run in range(args.runs):
+            for retailer in retailers:
+                retailer.generation = run
+            scrape_metrics.reset()
+            commits_before, requests_before = commits, farm_stats.requests
+            monitor = LoopLagMonitor()
+            monitor.start()
+
+            started = time.perf_counter()
+            async with SessionLocal() as db:
+                await scrape_all_products(db)
+            wall = time.perf_counter() - started
+            await monitor.stop()
+
+            runs.append({
+                "run": run + 1,
+                "urls": url_count,
+                "wall_seconds": round(wall, 2),
+                "urls_per_second": round(url_count / wall, 1),
+                "db_commits": commits - commits_before,
+                "http_requests": farm_stats.requests - requests_before,
+                "event_loop_lag": monitor.summary(),
+                "scrape_counters": scrape_metrics.snapshot(),
+            })
+    finally:
+        await close_http_client()
+        close_extraction_pool()
+        for server in servers:
+            server.close()
+        event.remove(engine.sync_engine, "commit", on_commit)
+        if not args.keep:
+            await cleanup(user_id)
+        await engine.dispose()
+
+    return {
+        "config": {key: value for key, value in vars(args).items() if key != "json"},
+        "farm": vars(farm_stats),
+        "runs": runs,
+    }
+
+def print_report(result: dict):
+    config = result["config"]
+    print(
+        f"scrape_all_products: {config['products']} products x {config['urls_per_product']} urls, "
+        f"{config['retailers']} retailers, ~{config['latency_ms']}ms latency, "
+        f"{config['error_rate']:.0%} errors, {config['page_kb']} KiB pages"
+    )
+    for run in result["runs"]:
+        lag = run["event_loop_lag"]
+        print(
+            f"  run {run['run']}: {run['wall_seconds']:>8}s  {run['urls_per_second']:>8} urls/s  "
+            f"{run['db_commits']:>5} commits  {run['http_requests']:>6} requests  "
+            f"loop lag p99 {lag['p99_ms']}ms max {lag['max_ms']}ms"
+        )
+        print(f"         counters: {run['scrape_counters']}")
+    print(f"  farm: {result['farm']}")
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--urls-per-product", type=int, default=2)
+    parser.add_argument("--retailers", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="mean response latency per retailer")
+    parser.add_argument("--slow-factor", type=float, default=1.0, help="latency multiplier for the first retailer")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 503")
+    parser.add_argument("--page-kb", type=int, default=64, help="padding added to every page")
+    parser.add_argument("--etag-share", type=float, default=0.5, help="share of retailers that answer 304")
+    parser.add_argument("--change-rate", type=float, default=0.1, help="share of prices that move between runs")
+    parser.add_argument("--runs", type=int, default=2, help="consecutive full scrapes (later runs hit caches)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keep", action="store_true", help="keep the seeded rows")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(bench(args))
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,13 @@
+import os
+
+# Settings() needs these even though the tests touch neither the DB nor SMTP
+for name, value in {
+    "DATABASE_URL": "postgresql+asyncpg://test@localhost/test",
+    "AUTH_SECRET_KEY": "test",
+    "EMAIL_FROM": "test@example.com",
+    "SMTP_SERVER": "localhost",
+    "SMTP_PORT": "25",
+    "SMTP_USER": "test",
+    "SMTP_PASS": "test",
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,27 @@
+"""canonical_url must merge spellings of one page and nothing else."""
+import pytest
+from app.utils.urls import canonical_url
+
+@pytest.mark.parametrize("a, b", [
+    ("http://www.Shop.com:80/p/Item-1/?utm_source=x#reviews", "https://shop.com/p/Item-1"),
+    ("https://shop.com/p/%7Eitem", "https://shop.com/p/~item"),
+    ("https://shop.com/p/a%2fb", "https://shop.com/p/a%2Fb"),
+    ("https://shop.com/p/caf%c3%a9", "https://shop.com/p/café"),
+    ("https://shop.com/p/a b", "https://shop.com/p/a%20b"),
+    ("https://shop.com/p?b=2&a=1&fbclid=z", "https://shop.com/p?a=1&b=2"),
+])
+def test_same_page(a, b):
+    assert canonical_url(a) == canonical_url(b)
+
+@pytest.mark.parametrize("a, b", [
+    ("https://shop.com/p/a%2Fb", "https://shop.com/p/a/b"),
+    ("https://shop.com/p/a%3Fb", "https://shop.com/p/a?b"),
+    ("https://shop.com/p/ABC", "https://shop.com/p/abc"),
+    ("https://shop.com/p?id=1", "https://shop.com/p?id=2"),
+])
+def test_different_pages(a, b):
+    assert canonical_url(a) != canonical_url(b)
+
+def test_escapes_are_normalized():
+    assert canonical_url("https://shop.com/p/a%2fb%7e%25") == "https://shop.com/p/a%2Fb~%25"
+    assert canonical_url("https://shop.com/p/100%") == "https://shop.com/p/100%25"
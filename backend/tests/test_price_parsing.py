@@ -0,0 +1,26 @@
+"""Structured-data prices come with either separator as the decimal point."""
+import pytest
+from app.services.scraper import _to_price, extract_price
+
+@pytest.mark.parametrize("value, expected", [
+    ("12.50", 12.5),
+    ("12,50", 12.5),
+    ("0,5", 0.5),
+    ("1,299", 1299.0),
+    ("1,299.00", 1299.0),
+    ("1.299,00", 1299.0),
+    ("1.299.000", 1299000.0),
+    ("€ 1.299,00", 1299.0),
+    ("$5.", 5.0),
+    (19, 19.0),
+])
+def test_to_price(value, expected):
+    assert _to_price(value) == expected
+
+@pytest.mark.parametrize("value", ["1,299,00", "1.234,567", "12,3456", "1.2.3", "", "n/a", None, True])
+def test_to_price_rejects_ambiguous(value):
+    assert _to_price(value) is None
+
+def test_comma_decimal_meta_and_text():
+    assert extract_price('<meta property="og:price:amount" content="12,50">') == 12.5
+    assert extract_price('<p>Now only €1.299,00 incl. VAT</p>') == 1299.0
@@ -0,0 +1,92 @@
+"""The rollup rebuild has to agree with the incremental rollups it backfills."""
+import random
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from uuid import uuid4
+import pytest
+from app.crud import _aggregate_rollups, _aggregate_runs, _run_sightings
+from app.enums import RollupGranularity
+from app.schemas.priceHistory import PriceHistoryCreate
+
+START = datetime(2025, 3, 30, 21, 5, tzinfo=timezone.utc)
+
+def scrape_observations(scrapes: int = 300, every: timedelta = timedelta(minutes=20)):
+    """Two products with two URLs each, scraped on a fixed interval, prices moving now and then."""
+    rng = random.Random(7)
+    urls = [(product_id, uuid4()) for product_id in (uuid4(), uuid4()) for _ in range(2)]
+    prices = {url_id: 100.0 for _, url_id in urls}
+    observations = []
+    for n in range(scrapes):
+        for offset, (product_id, url_id) in enumerate(urls):
+            if rng.random() < 0.05:
+                prices[url_id] = round(prices[url_id] * rng.uniform(0.8, 1.2), 2)
+            observations.append(PriceHistoryCreate(
+                product_id=product_id,
+                product_url_id=url_id,
+                recorded_at=START + n * every + timedelta(seconds=offset), # no ties within a product
+                price=prices[url_id],
+            ))
+    return observations
+
+def stored_every_scrape(observations):
+    return [
+        SimpleNamespace(**obs.model_dump(), last_seen_at=None)
+        for obs in sorted(observations, key=lambda o: (str(o.product_id), o.recorded_at))
+    ]
+
+def stored_on_change(observations):
+    # what _extend_unchanged_runs leaves behind: one row per run, last_seen_at = its last scrape
+    current, rows = {}, []
+    for obs in sorted(observations, key=lambda o: o.recorded_at):
+        row = current.get(obs.product_url_id)
+        if row is not None and row.price == obs.price:
+            row.last_seen_at = obs.recorded_at
+            continue
+        row = SimpleNamespace(**obs.model_dump(), last_seen_at=None)
+        current[obs.product_url_id] = row
+        rows.append(row)
+    return sorted(rows, key=lambda r: (str(r.product_id), r.recorded_at))
+
+def incremental(observations, key, granularity):
+    return [r for r in _aggregate_rollups(observations, key) if r["granularity"] == granularity.value]
+
+@pytest.mark.parametrize("key", ["product_id", "product_url_id"])
+@pytest.mark.parametrize("granularity", list(RollupGranularity))
+def test_rebuild_of_every_scrape_history_matches_incremental(key, granularity):
+    observations = scrape_observations()
+    live = incremental(observations, key, granularity)
+    rebuilt = _aggregate_runs(stored_every_scrape(observations), key, granularity)
+
+    assert len(rebuilt) == len(live)
+    for want, got in zip(live, rebuilt):
+        assert got == {**want, "price_sum": pytest.approx(want["price_sum"])}
+
+@pytest.mark.parametrize("key", ["product_id", "product_url_id"])
+@pytest.mark.parametrize("granularity", list(RollupGranularity))
+def test_rebuild_of_on_change_runs_covers_every_bucket(key, granularity):
+    observations = scrape_observations()
+    live = incremental(observations, key, granularity)
+    rebuilt = _aggregate_runs(stored_on_change(observations), key, granularity)
+
+    # every bucket a run spans is there, with the prices the scrapes saw; across a
+    # product's URLs, which one was scraped first or last in a bucket is not stored
+    fields = ("min_price", "max_price", "first_price", "last_price") if key == "product_url_id" else (
+        "min_price", "max_price"
+    )
+    assert [(r[key], r["bucket_start"]) for r in rebuilt] == [(r[key], r["bucket_start"]) for r in live]
+    for want, got in zip(live, rebuilt):
+        for field in fields:
+            assert got[field] == want[field]
+        # unchanged scrapes inside a run were never stored
+        assert 1 <= got["sample_count"] <= want["sample_count"]
+
+def test_run_sightings_span_buckets_and_respect_the_window():
+    recorded_at = datetime(2025, 1, 1, 10, 30, tzinfo=timezone.utc)
+    last_seen_at = datetime(2025, 1, 4, 2, 0, tzinfo=timezone.utc)
+    day = lambda d: datetime(2025, 1, d, tzinfo=timezone.utc)  # noqa: E731
+
+    assert list(_run_sightings(recorded_at, last_seen_at, RollupGranularity.DAY)) == [
+        recorded_at, day(2), day(3), last_seen_at
+    ]
+    assert list(_run_sightings(recorded_at, last_seen_at, RollupGranularity.DAY, day(2), day(3))) == [day(2)]
+    assert list(_run_sightings(recorded_at, None, RollupGranularity.HOUR)) == [recorded_at]